@@ -1,9 +1,16 @@
-import csv
 import discord
 from discord.ui import Select, View
 from asyncio import TimeoutError
 from datetime import datetime
 import logging
+import time
+from .reminders import reminder_scheduler, mentions_for
+from .plan_sessions import plan_sessions, post_plan
+from Data_extraction.datastore import get_store
+from Data_extraction.csv_cache import csv_cache
+from Data_extraction.models import Person, Task, Assignment
+from Data_extraction.Deputy.roster_cache import format_roster_age
+from Data_extraction.Deputy.shifts import shift_start
 
 intents = discord.Intents.default()
 intents.messages = True  # Allow reading messages
@@ -15,35 +22,6 @@ intents.members = True  # Enable fetching member details
 logging.basicConfig(
     level=logging.DEBUG)  # Set to DEBUG to see all log messages
 
-# Function to read CSV
-# Function to read names from a CSV file
-
-
-def read_csv(file_path):
-    options = []
-    logging.debug(f"Attempting to read CSV file: {file_path}")
-    try:
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            for index, row in enumerate(csv_reader):
-                label = row.get('label', '').strip()
-                value = row.get('value', '').strip(
-                ) or f"generated_value_{index}"  # Generate unique value if missing
-                username = row.get('username', '').strip()
-
-                options.append({
-                    'label': label,
-                    'value': value,
-                    'username': username
-                })
-                logging.debug(
-                    f"Processed option: Label={label}, Value={value}")
-            logging.info(f"Read {len(options)} names from {file_path}")
-    except Exception as e:
-        logging.error(f"Error reading CSV {file_path}: {e}")
-    return options
-
-
 # Helper to format places list with "and" between the last two cities
 def format_places_list(places):
     if len(places) > 1:
@@ -64,16 +42,19 @@ def weekday():
 # Dropdown and View classes
 class Dropdown(Select):
 
-    def __init__(self, placeholder, options, callback, multiple=False):
+    def __init__(self, placeholder, options, callback, multiple=False, custom_id=discord.utils.MISSING):
         super().__init__(
             placeholder=placeholder,
             options=[
-                discord.SelectOption(label=opt['label'], value=opt['value'])
+                # Pre-built options (e.g. Catalog.select_options()) are used as they are
+                opt if isinstance(opt, discord.SelectOption)
+                else discord.SelectOption(label=opt['label'], value=opt['value'])
                 for opt in options
             ],
             min_values=1,
             max_values=len(options)
-            if multiple else 1  # Allow multiple selections if `multiple=True`
+            if multiple else 1,  # Allow multiple selections if `multiple=True`
+            custom_id=custom_id
         )
         self.custom_callback = callback
 
@@ -108,54 +89,52 @@ async def read_chat(ctx, prompt_message, timeout=60):
             "No response received within the time limit. Skipping this step.")
         return None
 
-async def remind_task(ctx, selected_people, delay, message):
-    """Unified function to send reminders with delay."""
-    await asyncio.sleep(delay)
-    label_to_username = {row['label']: row['username'] for row in read_csv('Data/people_on_shift_ops.csv')}
-    mentions = " ".join([f"<{label_to_username.get(person['name'], person['name'])}>" for person in selected_people])
-    await ctx.send(f"{mentions} {message}")
+def remind_task(ctx, selected_people, due, message):
+    """Schedules a reminder for the selected people at an absolute time (Unix timestamp)."""
+    reminder_scheduler.schedule(ctx.channel.id, due, message, mentions_for(selected_people))
 
 
 # The plan function
-async def mechplan(ctx):
+async def mechplan(ctx, people_options=None, roster_updated_at=None, plan_for=None):
     try:
-        # Load data from CSV files
-        people_options = read_csv('Data/people_on_shift_mech.csv')
-        places_options = read_csv('Data/tasks_mech.csv')
+        # Load data from CSV files, unless the cached roster was passed in
+        if people_options is None:
+            people_options = await csv_cache.read('Data/people_on_shift_mech.csv', Person.from_row)
+        places_options = await csv_cache.catalog('Data/tasks_mech.csv', Task)
+
+        if not people_options:
+            # Discord rejects a dropdown without options
+            await ctx.send("Nobody was found on the roster for this shift. Please try again later.")
+            return
 
-        selected_people = []
-        selected_places = {}
+        # This plan's own state, separate from any other plan in progress
+        session = plan_sessions.start(ctx, "mech")
+        selected_people = session.selected_people
+        selected_places = session.selected_places
 
         # List to store messages sent by the bot
-        bot_messages = []
+        bot_messages = session.bot_messages
 
         async def people_callback(interaction):
+            if not session.active:
+                await interaction.response.send_message("This plan was replaced by a newer one.", ephemeral=True)
+                return
             try:
-                selected_people.extend([
-                    {
-                        "name": option["label"],
-                        "username": option.get("username", "Unknown")
-                    } for option in people_options
-                    if option["value"] in interaction.data["values"]
-                ])  # Extract labels and usernames for selected people
-
-                # Write the selected people to the file
-                with open("Data/Current_shift.csv",
-                          mode="w",
-                          newline="",
-                          encoding="utf-8") as file:
-                    writer = csv.writer(file)
-                    writer.writerow(["label", "Username"])  # Write header
-                    for person in selected_people:
-                        writer.writerow([person["name"], person["username"]])
-
-                logging.info(
-                    f"Written {len(selected_people)} people to Current_shift.csv."
+                selected_values = set(interaction.data["values"])
+                selected_people.extend(
+                    person for person in people_options
+                    if person.value in selected_values
+                )  # Keep references to the selected people
+
+                # Store the plan with the selected people
+                session.plan_id = await get_store().create_plan(
+                    ctx.guild.id, ctx.channel.id, "mech", ctx.author.id, ctx.author.display_name, selected_people
                 )
+                logging.info(f"Stored {len(selected_people)} people in plan {session.plan_id}.")
 
                 if not interaction.response.is_done():
                     await interaction.response.send_message(
-                        f"You selected: {', '.join([person['name'] for person in selected_people])} (People)",
+                        f"You selected: {', '.join([person.name for person in selected_people])} (People)",
                         ephemeral=True)
 
                 if selected_people:
@@ -169,18 +148,21 @@ async def mechplan(ctx):
 
         # Places selection callback
         async def place_callback(interaction, person):
+            if not session.active:
+                await interaction.response.send_message("This plan was replaced by a newer one.", ephemeral=True)
+                return
             try:
                 await interaction.response.defer(
                 )  # Acknowledge the interaction
-                person_name = person['name']
+                person_name = person.name
 
                 # Map selected dropdown values to labels
                 places = [
-                    next((opt['label'] for opt in places_options
-                          if f"{person_name}_{opt['value']}" == value), value)
+                    places_options.label(value)
                     for value in interaction.data['values']
                 ]
-                selected_places[person_name] = places
+                selected_places[person_name] = Assignment(person, places)
+                await get_store().set_areas(session.plan_id, person_name, places)
 
                 logging.debug(f"Updated selected_places: {selected_places}")
 
@@ -203,24 +185,18 @@ async def mechplan(ctx):
         async def create_places_dropdowns():
             dropdowns = []
 
-            for person in selected_people:
-                person_places_options = [{
-                    "label":
-                    opt["label"],
-                    "value":
-                    f"{person['name']}_{opt['value']}"
-                } for opt in places_options]
-
-                logging.debug(
-                    f"Dropdown options for {person['name']}: {person_places_options}"
-                )
-
-                dropdown = Dropdown(placeholder=f"{person['name']}",
-                                    options=person_places_options,
+            for slot, person in enumerate(selected_people):
+                # Every dropdown shares the catalog's options, only the custom_id is the person's own
+                dropdown = Dropdown(placeholder=f"{person.name}",
+                                    options=places_options.select_options(),
                                     callback=lambda interaction, p=person:
                                     place_callback(interaction, p),
-                                    multiple=True)
+                                    multiple=True,
+                                    custom_id=f"tasks:{session.plan_id}:{slot}")
                 dropdowns.append(dropdown)
+            logging.debug(
+                f"Created {len(dropdowns)} task dropdowns with {len(places_options)} options each."
+            )
 
             if not dropdowns:
                 logging.error(
@@ -272,34 +248,17 @@ async def mechplan(ctx):
             return goal
 
         async def send_final_message(goal, comment):
-            # Create a mapping of `label` to `username` (Discord IDs)
-            label_to_username = {
-                row['label']: row['username']
-                for row in people_options
-            }
-
-            # Map dropdown values back to labels
-            value_to_label = {
-                f"{person['name']}_{opt['value']}": opt['label']
-                for opt in places_options
-                for person in selected_people
-            }
-
-            # Generate formatted places
+            # The tasks were mapped to labels when selected, so only the mentions are left
             formatted_places = {
-                person['name'] if isinstance(person, dict) else person: [
-                    value_to_label.get(
-                        value,
-                        value)  # Use the label if found, fallback to value
-                    for value in places
-                ]
-                for person, places in selected_places.items()
+                assignment.person.mention: assignment.areas
+                for assignment in selected_places.values()
             }
 
             logging.debug(
                 f"Formatted places for final message: {formatted_places}")
 
-            now = datetime.now()
+            # Plan for the requested shift, or the current one
+            now = shift_start(*plan_for) if plan_for else datetime.now()
             date_string = now.strftime("%d.%m.%Y")
             today = weekday()
             shift_text = (
@@ -312,10 +271,11 @@ async def mechplan(ctx):
                 f"**{today}**\n\n"
                 f"Today's Goal: {goal}\n\n"
                 f"**Skiftleder: {ctx.author.display_name}**\n\n"
-                "📋**Dagens Ansvarsområder:**:\n" + "\n".join([
-                    f"- <{label_to_username.get(person['name'] if isinstance(person, dict) else person, person)}> "
+                + (f"_Vaktliste fra Deputy oppdatert {format_roster_age(roster_updated_at)}_\n\n" if roster_updated_at else "")
+                + "📋**Dagens Ansvarsområder:**:\n" + "\n".join([
+                    f"- {mention} "
                     f"{format_places_list(places)}"
-                    for person, places in formatted_places.items()
+                    for mention, places in formatted_places.items()
                 ]) + "\n"
                 f"** Her finner du rutinene **\n"
                 f" <#1333539529885351967>\n\n"
@@ -337,26 +297,21 @@ async def mechplan(ctx):
                 except Exception as e:
                     logging.warning(f"Failed to delete message: {e}")
 
-            # Unpin old messages and pin the new one
-            pinned_messages = await ctx.channel.pins()
-            for pinned_msg in pinned_messages:
-                if pinned_msg.author == ctx.me:
-                    await pinned_msg.unpin()
-
-            # Send and pin the final message
-            final_msg = await ctx.send(shift_plan_message)
-            await final_msg.pin()
-            logging.info("Pinned the new message.")
-            await remind_task(ctx, selected_people, 360 * 60, "Husk at alle batterie skal ut før dagen dere går hjem!")
-            await remind_task(ctx, selected_people, 45 * 60, "Husk å legg verktøy der det hører hjemme")
+            # Send the final message and pin it in place of the previous mech plan
+            await post_plan(ctx, session, shift_plan_message)
+            plan_sessions.end(session)
+            # Reminders are counted from when the plan is posted
+            posted_at = time.time()
+            remind_task(ctx, selected_people, posted_at + 360 * 60, "Husk at alle batterie skal ut før dagen dere går hjem!")
+            remind_task(ctx, selected_people, posted_at + 45 * 60, "Husk å legg verktøy der det hører hjemme")
 
 
 
         dropdown_options = [
             discord.SelectOption(
-                label=opt['label'],
-                value=opt['value'],
-            ) for opt in people_options
+                label=person.name,
+                value=person.value,
+            ) for person in people_options
         ]
 
         # Create the dropdown
@@ -372,7 +327,8 @@ async def mechplan(ctx):
         # Create the view and add the dropdown
         view = View()
         view.add_item(people_dropdown)
-        msg = await ctx.send("Vennligst velg ansatte:", view=view)
+        roster_age = f" (vaktliste oppdatert {format_roster_age(roster_updated_at)})" if roster_updated_at else ""
+        msg = await ctx.send(f"Vennligst velg ansatte{roster_age}:", view=view)
         bot_messages.append(msg)
 
     except Exception as e:
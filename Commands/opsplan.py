@@ -1,4 +1,3 @@
-import csv
 import discord
 from discord.ext import commands
 from discord.ui import Select, View
@@ -6,8 +5,17 @@ from asyncio import TimeoutError
 import random
 from datetime import datetime
 import logging
-from .update_roles import update_roles
-import asyncio
+from .update_roles import update_roles, reconcile_role, apply_role_changes
+from .role_executor import RoleChangeBatch
+import time
+from .reminders import reminder_scheduler, mentions_for
+from Data_extraction.Deputy.roster_cache import format_roster_age
+from Data_extraction.Deputy.shifts import shift_start
+from Data_extraction.Deputy.member_snapshot import member_snapshot
+from .plan_sessions import plan_sessions, post_plan
+from Data_extraction.datastore import get_store
+from Data_extraction.csv_cache import csv_cache
+from Data_extraction.models import Person, Area, Assignment
 
 intents = discord.Intents.default()
 intents.messages = True  # Allow reading messages
@@ -18,32 +26,6 @@ intents.members = True  # Enable fetching member details
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)  # Set to DEBUG to see all log messages
 
-# Function to read CSV
-# Function to read names from a CSV file
-
-
-def read_csv(file_path):
-    options = []
-    logging.debug(f"Attempting to read CSV file: {file_path}")
-    try:
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            for index, row in enumerate(csv_reader):
-                label = row.get('label', '').strip()
-                value = row.get('value', '').strip() or f"generated_value_{index}"  # Generate unique value if missing
-                username = row.get('username', '').strip() 
-
-                options.append({
-                    'label': label,
-                    'value': value,
-                    'username': username
-                })
-                logging.debug(f"Processed option: Label={label}, Value={value}")
-            logging.info(f"Read {len(options)} names from {file_path}")
-    except Exception as e:
-        logging.error(f"Error reading CSV {file_path}: {e}")
-    return options
-
 # Helper to format places list with "and" between the last two cities
 def format_places_list(places):
     if len(places) > 1:
@@ -69,15 +51,18 @@ def generate_days_options():
 
 # Dropdown and View classes
 class Dropdown(Select):
-    def __init__(self, placeholder, options, callback, multiple=False):
+    def __init__(self, placeholder, options, callback, multiple=False, custom_id=discord.utils.MISSING):
         super().__init__(
             placeholder=placeholder,
             options=[
-                discord.SelectOption(label=opt['label'], value=opt['value'])
+                # Pre-built options (e.g. Catalog.select_options()) are used as they are
+                opt if isinstance(opt, discord.SelectOption)
+                else discord.SelectOption(label=opt['label'], value=opt['value'])
                 for opt in options
             ],
             min_values=1,
-            max_values=len(options) if multiple else 1  # Allow multiple selections if `multiple=True`
+            max_values=len(options) if multiple else 1,  # Allow multiple selections if `multiple=True`
+            custom_id=custom_id
         )
         self.custom_callback = callback
 
@@ -106,119 +91,86 @@ async def read_chat(ctx, prompt_message, timeout=60):
         msg = await ctx.send("No response received within the time limit. Skipping this step.")
         return None
 
-def update_skiftleder_csv(file_path, skiftleder_name):
-    """Creates or overwrites the skiftleder.csv file with the current skiftleder name."""
-    with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        
-        # Write the header
-        writer.writerow(['Skiftleder'])
-        
-        # Write the current skiftleder's name
-        writer.writerow([skiftleder_name])
-        logging.info(f"Skiftleder {skiftleder_name} written to {file_path}")
-
-
-
-async def update_skiftleder_roles(ctx):
+async def update_skiftleder_roles(ctx, plan_id, batch=None):
+    """Gives "Nivel" to the plan's shift leader, and takes it from the previous one."""
     guild = ctx.guild
-    skiftleder_file = 'Data/skiftleder.csv'
     role_name = "Nivel"
     try:
+        await member_snapshot.members_ready(guild)
+
         # Fetch the role
         role = discord.utils.get(guild.roles, name=role_name)
         if not role:
             logging.warning(f"Role '{role_name}' not found in the server.")
             return  # Exit early if role doesn't exist
 
-        # Remove the role from all members
-        logging.info(f"Removing role '{role_name}' from all members...")
-        for member in guild.members:
-            if role in member.roles:
-                try:
-                    await member.remove_roles(role)
-                    logging.info(f"Role '{role_name}' removed from '{member.display_name}'.")
-                except discord.Forbidden:
-                    logging.warning(f"Missing permissions to remove role '{role_name}' from '{member.display_name}'.")
-                except Exception as e:
-                    logging.error(f"An error occurred while removing role from '{member.display_name}': {e}")
-
-        # Assign role to the new shift leader
-        with open(skiftleder_file, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            row = next(csv_reader, None)  # Expecting a single row
-            if not row or 'Skiftleder' not in row:
-                logging.error(f"Skiftleder name missing in '{skiftleder_file}'.")
-                return
-
-            skiftleder_name = row['Skiftleder'].strip()
-            new_leader = discord.utils.get(guild.members, display_name=skiftleder_name)
-            if not new_leader:
-                logging.warning(f"Shift leader '{skiftleder_name}' not found in the server.")
-                return
+        # Find the new shift leader
+        plan = await get_store().get_plan(plan_id)
+        new_leader = guild.get_member(plan['leader_id']) if plan else None
+        if not new_leader:
+            logging.warning(f"Shift leader of plan {plan_id} not found in the server.")
+            return
 
-            if guild.me.top_role <= new_leader.top_role:
-                logging.warning(f"Cannot assign role to '{new_leader.display_name}' due to hierarchy restrictions.")
-                return
+        target_ids = {new_leader.id}
+        if role not in new_leader.roles and guild.me.top_role <= new_leader.top_role:
+            logging.warning(f"Cannot assign role to '{new_leader.display_name}' due to hierarchy restrictions.")
+            target_ids = set()  # The previous leader still loses the role
 
-            await new_leader.add_roles(role)
-            logging.info(f"Assigned role '{role_name}' to '{new_leader.display_name}'.")
+        # Only the previous leader loses the role, and only if the leader changed
+        return await reconcile_role(guild, role, target_ids, batch)
 
-    except FileNotFoundError:
-        logging.error(f"File '{skiftleder_file}' not found.")
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
 
 
 
-async def remind_task(ctx, selected_people, delay, message):
-    """Unified function to send reminders with delay."""
-    await asyncio.sleep(delay)
-    label_to_username = {row['label']: row['username'] for row in     read_csv('Data/people_on_shift_ops.csv')}
-    mentions = " ".join([f"<{label_to_username.get(person['name'], person['name'])}>" for person in selected_people])    
-    await ctx.send(f"{mentions} {message}")
+def remind_task(ctx, selected_people, due, message):
+    """Schedules a reminder for the selected people at an absolute time (Unix timestamp)."""
+    reminder_scheduler.schedule(ctx.channel.id, due, message, mentions_for(selected_people))
 
 # The opsplan function
-async def opsplan(ctx):
+async def opsplan(ctx, people_options=None, roster_updated_at=None, plan_for=None):
     try:
-        # Load data from CSV files
-        people_options = read_csv('Data/people_on_shift_ops.csv')
-        places_options = read_csv('Data/Bergen_areas.csv')
-
-        selected_people = []
-        selected_places = {}
+        # Load data from CSV files, unless the cached roster was passed in
+        if people_options is None:
+            people_options = await csv_cache.read('Data/people_on_shift_ops.csv', Person.from_row)
+        places_options = await csv_cache.catalog('Data/Bergen_areas.csv', Area)
+
+        if not people_options:
+            # Discord rejects a dropdown without options
+            await ctx.send("Nobody was found on the roster for this shift. Please try again later.")
+            return
+
+        # This plan's own state, separate from any other plan in progress
+        session = plan_sessions.start(ctx, "ops")
+        selected_people = session.selected_people
+        selected_places = session.selected_places
         selected_percentage = None
         selected_goal_percentage = None
         selected_days_inactive = None
 
         # List to store messages sent by the bot
-        bot_messages = []
+        bot_messages = session.bot_messages
 
         async def people_callback(interaction):
+            if not session.active:
+                await interaction.response.send_message("This plan was replaced by a newer one.", ephemeral=True)
+                return
             try:
+                selected_values = set(interaction.data["values"])
                 selected_people.extend(
-                    [
-                        {
-                            "name": option["label"],
-                            "username": option.get("username", "Unknown")
-                        }
-                        for option in people_options
-                        if option["value"] in interaction.data["values"]
-                    ]
-                )  # Extract labels and usernames for selected people
-
-                # Write the selected people to the file
-                with open("Data/Current_shift.csv", mode="w", newline="", encoding="utf-8") as file:
-                    writer = csv.writer(file)
-                    writer.writerow(["label", "Username"])  # Write header
-                    for person in selected_people:
-                        writer.writerow([person["name"], person["username"]])
-
-                logging.info(f"Written {len(selected_people)} people to Current_shift.csv.")
+                    person for person in people_options if person.value in selected_values
+                )  # Keep references to the selected people
+
+                # Store the plan with the selected people
+                session.plan_id = await get_store().create_plan(
+                    ctx.guild.id, ctx.channel.id, "ops", ctx.author.id, ctx.author.display_name, selected_people
+                )
+                logging.info(f"Stored {len(selected_people)} people in plan {session.plan_id}.")
 
                 # Inform the user and proceed
                 msg = await interaction.response.send_message(
-                    f"You selected: {', '.join([person['name'] for person in selected_people])} (People)", ephemeral=True
+                    f"You selected: {', '.join([person.name for person in selected_people])} (People)", ephemeral=True
                 )
                 bot_messages.append(msg)
 
@@ -230,16 +182,16 @@ async def opsplan(ctx):
 
         # Places selection callback
         async def place_callback(interaction, person):
+            if not session.active:
+                await interaction.response.send_message("This plan was replaced by a newer one.", ephemeral=True)
+                return
             try:
-                # Use the 'name' field of the person dictionary as the key
-                person_name = person['name']
+                # Use the person's name as the key
+                person_name = person.name
                 
                 # Map selected dropdown `value`s back to their human-readable `label`s
-                places = [
-                    next((opt['label'] for opt in places_options if f"{person_name}_{i}_{opt['value']}" == value), value)
-                    for i, value in enumerate(interaction.data['values'])
-                ]
-                selected_places[person_name] = places  # Store the mapped labels for the selected places
+                places = [places_options.label(value) for value in interaction.data['values']]
+                selected_places[person_name] = Assignment(person, places)  # Store the mapped labels for the selected places
 
                 logging.debug(f"Updated selected_places: {selected_places}")
 
@@ -247,6 +199,7 @@ async def opsplan(ctx):
                 await interaction.response.send_message(
                     f"{person_name} will drive to {format_places_list(places)}", ephemeral=True
                 )
+                await get_store().set_areas(session.plan_id, person_name, places)
 
                 # Check if all places are assigned
                 if len(selected_places) == len(selected_people):
@@ -258,23 +211,17 @@ async def opsplan(ctx):
         async def create_places_dropdowns():
             dropdowns = []
 
-            for person in selected_people:
-                # Generate unique dropdown values
-                person_places_options = [
-                    {"label": opt["label"], "value": f"{person['name']}_{opt['value']}"}
-                    for opt in places_options
-                ]
-
-                # Log the generated options
-                logging.debug(f"Dropdown options for {person['name']}: {person_places_options}")
-
+            for slot, person in enumerate(selected_people):
+                # Every dropdown shares the catalog's options, only the custom_id is the person's own
                 dropdown = Dropdown(
-                    placeholder=f"Where should {person['name']} drive?",
-                    options=person_places_options,
+                    placeholder=f"Where should {person.name} drive?",
+                    options=places_options.select_options(),
                     callback=lambda interaction, p=person: place_callback(interaction, p),
-                    multiple=True
+                    multiple=True,
+                    custom_id=f"places:{session.plan_id}:{slot}"
                 )
                 dropdowns.append(dropdown)
+            logging.debug(f"Created {len(dropdowns)} area dropdowns with {len(places_options)} options each.")
 
             if not dropdowns:
                 logging.error("No dropdowns created. Check selected_people and places_options.")
@@ -324,24 +271,16 @@ async def opsplan(ctx):
                 await send_final_message(additional_comment)
 
             async def send_final_message(comment):
-                # Create a mapping of `label` to `username` (Discord IDs)
-                label_to_username = {row['label']: row['username'] for row in people_options}
-                
-                # Map dropdown values back to labels
-                value_to_label = {f"{person['name']}_{opt['value']}": opt['label'] for opt in places_options for person in selected_people}
-
-                # Validate `person` data type and generate formatted places
+                # The places were mapped to labels when selected, so only the mentions are left
                 formatted_places = {
-                    person['name'] if isinstance(person, dict) else person: [
-                        value_to_label.get(value, value)  # Use the label if found, fallback to value
-                        for value in places
-                    ]
-                    for person, places in selected_places.items()
+                    assignment.person.mention: assignment.areas
+                    for assignment in selected_places.values()
                 }
 
                 logging.debug(f"Formatted places for final message: {formatted_places}")
 
-                now = datetime.now()
+                # Plan for the requested shift, or the current one
+                now = shift_start(*plan_for) if plan_for else datetime.now()
                 date_string = now.strftime("%d.%m.%Y")
                 today = weekday()
                 shift_text = (
@@ -354,15 +293,16 @@ async def opsplan(ctx):
                     f"{shift_text}\n\n"
                     f"**{today}**\n\n"
                     f"**Skiftleder: {ctx.author.display_name}**\n\n"
-                    f" **Goal** \n"
+                    + (f"_Vaktliste fra Deputy oppdatert {format_roster_age(roster_updated_at)}_\n\n" if roster_updated_at else "")
+                    + f" **Goal** \n"
                     f"- Availability: 🎯 {selected_goal_percentage}%\n\n"
                     "🚦 **Team and Areas**:\n"
                     + "\n".join(
                         [
-                            f"- <{label_to_username.get(person['name'] if isinstance(person, dict) else person, person)}> "
+                            f"- {mention} "
                             f"{random.choice(['kjører', 'fikser', 'ordner', 'cleaner','redder', 'går crazy på', 'gønner', 'swiper', 'går løs på', ''])} "
                             f"{format_places_list(places)}"
-                            for person, places in formatted_places.items()
+                            for mention, places in formatted_places.items()
                         ]
                     )
                     + "\n\n📋 **Operational Notes**:\n"
@@ -392,27 +332,24 @@ async def opsplan(ctx):
                     except Exception as e:
                         logging.warning(f"Failed to delete message: {e}")
 
-                # Fetch pinned messages and unpin the previous one, if any
-                pinned_messages = await ctx.channel.pins()
-                for pinned_msg in pinned_messages:
-                    if pinned_msg.author == ctx.me:  # Check if the pinned message belongs to the bot
-                        await pinned_msg.unpin()
-                        logging.info(f"Unpinned messages")
-
-                # Overwrite the skiftleder.csv file with the current skiftleder's name
-                update_skiftleder_csv('Data/skiftleder.csv', ctx.author.display_name)
-                await update_skiftleder_roles(ctx)
-                await update_roles(ctx, "Data/Current_shift.csv")
-
-                # Send the final message and pin it
-                final_msg = await ctx.send(shift_plan_message)
-                await final_msg.pin()
-                logging.info(f"Pinned the new message")
-                await remind_task(ctx, selected_people, 60, "Husk å sende rute!")
-                await remind_task(ctx, selected_people, 15 * 60, "Husk å starte Use Car 🚗!")
-                await remind_task(ctx, selected_people, 10 * 60, "Husk å sende inn avvik på bilen!")
+                # Both roles in one batch, so the shift leader's roles change with a single request.
+                # One plan at a time per guild, so concurrent plans do not diff against stale role holders.
+                async with plan_sessions.lock("roles", ctx.guild.id):
+                    role_changes = RoleChangeBatch()
+                    await update_skiftleder_roles(ctx, session.plan_id, role_changes)
+                    await update_roles(ctx, session.plan_id, batch=role_changes)
+                    await apply_role_changes(role_changes, reason=f"Shift plan by {ctx.author.display_name}")
+
+                # Send the final message and pin it in place of the previous ops plan
+                await post_plan(ctx, session, shift_plan_message)
+                plan_sessions.end(session)
+                # Reminders are counted from when the plan is posted
+                posted_at = time.time()
+                remind_task(ctx, selected_people, posted_at + 60, "Husk å sende rute!")
+                remind_task(ctx, selected_people, posted_at + 15 * 60, "Husk å starte Use Car 🚗!")
+                remind_task(ctx, selected_people, posted_at + 10 * 60, "Husk å sende inn avvik på bilen!")
                 if datetime.now().weekday() == 4:
-                    await remind_task(ctx, selected_people, 180 * 60, "Husk at bilen skal vaskes! 🚗💦")
+                    remind_task(ctx, selected_people, posted_at + 180 * 60, "Husk at bilen skal vaskes! 🚗💦")
 
 
 
@@ -445,10 +382,10 @@ async def opsplan(ctx):
 
         dropdown_options = [
             discord.SelectOption(
-                label=opt['label'],
-                value=opt['value'],
+                label=person.name,
+                value=person.value,
             )
-            for opt in people_options
+            for person in people_options
         ]
 
         # Log the processed dropdown options
@@ -466,7 +403,8 @@ async def opsplan(ctx):
         # Create the view and add the dropdown
         view = View()
         view.add_item(people_dropdown)
-        msg = await ctx.send("Please select the people first:", view=view)
+        roster_age = f" (Deputy roster updated {format_roster_age(roster_updated_at)})" if roster_updated_at else ""
+        msg = await ctx.send(f"Please select the people first{roster_age}:", view=view)
         bot_messages.append(msg)
 
     except Exception as e:
@@ -9,6 +9,7 @@ import logging
 from .update_roles import update_roles
 import asyncio
 from functools import partial  # Added for proper callback handling
+from Data_extraction.csv_cache import csv_cache, option_row
 
 intents = discord.Intents.default()
 intents.messages = True  
@@ -18,25 +19,6 @@ intents.members = True
 
 logging.basicConfig(level=logging.DEBUG)  
 
-# Function to read CSV files
-def read_csv(file_path):
-    options = []
-    logging.debug(f"Reading CSV file: {file_path}")
-    try:
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            for index, row in enumerate(csv_reader):
-                label = row.get('label', '').strip()
-                value = row.get('value', '').strip() or f"generated_value_{index}" 
-                username = row.get('username', '').strip()
-
-                options.append({'label': label, 'value': value, 'username': username})
-                logging.debug(f"Processed: Label={label}, Value={value}")
-            logging.info(f"Loaded {len(options)} entries from {file_path}")
-    except Exception as e:
-        logging.error(f"Error reading CSV {file_path}: {e}")
-    return options
-
 def format_places_list(places):
     return f"{', '.join(places[:-1])} og {places[-1]}" if len(places) > 1 else places[0]
 
@@ -88,14 +70,14 @@ class DropdownView(View):
 async def remind_task(ctx, selected_people, delay, message):
     """Unified function to send reminders with delay."""
     await asyncio.sleep(delay)
-    label_to_username = {row['label']: row['username'] for row in read_csv('Data/people_on_shift_ops.csv')}
+    label_to_username = {row['label']: row['username'] for row in await csv_cache.read('Data/people_on_shift_ops.csv', option_row)}
     mentions = " ".join([f"<@{label_to_username.get(person['name'], person['name'])}>" for person in selected_people])
     await ctx.send(f"{mentions} {message}")
 
 async def opsplan(ctx):
     try:
-        people_options = read_csv('Data/people_on_shift_ops.csv')
-        places_options = read_csv('Data/Bergen_areas.csv')
+        people_options = await csv_cache.read('Data/people_on_shift_ops.csv', option_row)
+        places_options = await csv_cache.read('Data/Bergen_areas.csv', option_row)
 
         selected_people = []
         selected_places = {}
@@ -156,7 +138,7 @@ async def opsplan(ctx):
             today = weekday()
             shift_text = "🌅 Morning Shift" if 6 <= now.hour < 14 else "🌄 Evening Shift" if 14 <= now.hour < 22 else "🌠 Night Shift"
 
-            label_to_username = {row['label']: row['username'] for row in read_csv('Data/people_on_shift_ops.csv')}
+            label_to_username = {row['label']: row['username'] for row in await csv_cache.read('Data/people_on_shift_ops.csv', option_row)}
 
             shift_plan_message = (
                 f"{shift_text} - {date_string}\n\n"
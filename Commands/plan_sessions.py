@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+
+from Data_extraction.datastore import get_store
+
+
+class PlanSession:
+    """
+    The state of one plan in progress: who is planning where, the stored
+    plan's ID, the selections so far and the bot messages to clean up.
+    """
+
+    def __init__(self, key, kind):
+        self.key = key  # (guild ID, channel ID, author ID)
+        self.kind = kind  # "ops" or "mech"
+        self.plan_id = None  # Set when the people are selected
+        self.selected_people = []
+        self.selected_places = {}
+        self.bot_messages = []
+        self.started_at = time.time()
+        self.active = True
+
+
+class PlanSessions:
+    """
+    Registry of the plans in progress, keyed by (guild, channel, author).
+
+    Every !opsplan/!mechplan run gets its own session, so plans by
+    different leaders, or in different channels, never share state. A
+    leader who starts a new plan in the same channel replaces their old
+    session; its dropdowns stop working.
+
+    What plans do share (the on-shift roles of a guild, the pins of a
+    channel) is changed under a per-resource lock, see lock().
+    """
+
+    def __init__(self):
+        self._sessions = {}  # (guild ID, channel ID, author ID) -> PlanSession
+        self._locks = {}  # Resource key -> asyncio.Lock
+
+    @staticmethod
+    def key_for(ctx):
+        return ctx.guild.id, ctx.channel.id, ctx.author.id
+
+    def start(self, ctx, kind):
+        """Starts a session for the command's author, replacing any earlier one in the channel."""
+        key = self.key_for(ctx)
+        previous = self._sessions.get(key)
+        if previous:
+            previous.active = False
+            logging.info(f"Replacing the {previous.kind} plan in progress for {ctx.author.display_name}.")
+        session = self._sessions[key] = PlanSession(key, kind)
+        return session
+
+    def get(self, ctx):
+        return self._sessions.get(self.key_for(ctx))
+
+    def end(self, session):
+        session.active = False
+        if self._sessions.get(session.key) is session:
+            del self._sessions[session.key]
+
+    def lock(self, *resource):
+        """
+        Returns the lock for a shared resource, e.g. lock("roles", guild.id)
+        or lock("pins", channel.id).
+        """
+        return self._locks.setdefault(resource, asyncio.Lock())
+
+
+async def post_plan(ctx, session, content):
+    """
+    Posts and pins a finished plan, and unpins the previous plan of the same
+    kind in the channel. The latest plan of every other kind stays pinned,
+    so an ops and a mech plan in one channel do not unpin each other.
+
+    Returns:
+        The posted message.
+    """
+    async with plan_sessions.lock("pins", ctx.channel.id):
+        keep = await get_store().pinned_plan_messages(ctx.guild.id, ctx.channel.id, exclude_kind=session.kind)
+        for pinned_msg in await ctx.channel.pins():
+            if pinned_msg.author == ctx.me and pinned_msg.id not in keep:
+                await pinned_msg.unpin()
+                logging.info("Unpinned the previous plan.")
+
+        final_msg = await ctx.send(content)
+        await final_msg.pin()
+        logging.info("Pinned the new message.")
+        await get_store().finish_plan(session.plan_id, final_msg.id)
+    return final_msg
+
+
+plan_sessions = PlanSessions()
@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import uuid
+
+from Data_extraction.datastore import get_store
+
+MAX_LATENESS = 60 * 60  # Reminders missed by more than this (e.g. while the bot was down) are dropped
+COALESCE_WINDOW = 30  # Reminders for a channel due within this many seconds are sent as one message
+MESSAGE_LIMIT = 2000  # Discord's message length limit
+
+
+def mentions_for(people):
+    """
+    Resolves the people in a plan to mentions once, when the reminder is
+    scheduled: '<@id>' for matched people, the name for the rest.
+
+    Args:
+        people (list): The Person objects in the plan.
+    """
+    return [person.mention for person in people]
+
+
+def compose(reminders):
+    """
+    Builds the messages for reminders going to one channel: one line per
+    distinct reminder text, with everyone it is for, split at Discord's limit.
+    """
+    lines = {}  # Reminder text -> mentions, in due order
+    for reminder in reminders:
+        mentions = lines.setdefault(reminder["message"], [])
+        mentions.extend(mention for mention in reminder["mentions"] if mention not in mentions)
+
+    messages, current = [], ""
+    for message, mentions in lines.items():
+        line = f"{' '.join(mentions)} {message}".strip()
+        if current and len(current) + 1 + len(line) > MESSAGE_LIMIT:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+
+class ReminderScheduler:
+    """
+    Sends plan reminders at absolute times, from one background task.
+
+    Reminders sit in a min-heap ordered by due time and are kept in the
+    data store's reminders table, so they survive a restart. The task sleeps until
+    the earliest reminder is due (or a new one is scheduled). It then takes
+    every reminder due within the coalesce window, groups them per channel
+    and sends each channel one message (see compose()) in its own task, so a
+    slow send does not hold up the next one.
+
+    Args:
+        max_lateness (float): Seconds after its due time a reminder is still sent.
+        coalesce_window (float): Reminders due this many seconds after the
+            earliest one are sent together with it.
+    """
+
+    def __init__(self, max_lateness=MAX_LATENESS, coalesce_window=COALESCE_WINDOW):
+        self.max_lateness = max_lateness
+        self.coalesce_window = coalesce_window
+        self._heap = []  # (due, sequence, reminder)
+        self._sequence = itertools.count()  # Keeps reminders due at the same time in the order they were scheduled
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._sending = set()  # Send tasks in flight, referenced until they finish
+        self._bot = None
+
+    def start(self, bot):
+        """Starts the scheduler task (once), e.g. from on_ready. It first loads the stored reminders."""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _load(self):
+        scheduled = {reminder["id"] for _, _, reminder in self._heap}
+        for reminder in await get_store().reminders():
+            if reminder["id"] not in scheduled:
+                heapq.heappush(self._heap, (reminder["due"], next(self._sequence), reminder))
+        logging.info(f"Loaded {len(self._heap)} pending reminders.")
+
+    def schedule(self, channel_id, due, message, mentions=()):
+        """
+        Schedules a reminder.
+
+        Args:
+            channel_id (int): The channel to send it in.
+            due (float): Unix time to send it at.
+            message (str): The reminder text.
+            mentions (list): Mentions to put in front of the text, e.g. from mentions_for().
+        """
+        reminder = {"id": uuid.uuid4().hex, "channel_id": channel_id, "due": due, "message": message, "mentions": list(mentions)}
+        heapq.heappush(self._heap, (due, next(self._sequence), reminder))
+        get_store().add_reminder(reminder)
+        self._wakeup.set()
+
+    def pending(self, channel_id=None):
+        """Returns the pending reminders, earliest first, optionally for one channel."""
+        return [
+            reminder for _, _, reminder in sorted(self._heap)
+            if channel_id is None or reminder["channel_id"] == channel_id
+        ]
+
+    async def _run(self):
+        await self._load()
+        while True:
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            by_channel, done = {}, []
+            while self._heap and self._heap[0][0] <= now + self.coalesce_window:
+                due, _, reminder = heapq.heappop(self._heap)
+                done.append(reminder["id"])
+                if now - due > self.max_lateness:
+                    logging.warning(f"Dropping reminder missed by {(now - due) / 60:.0f} min: {reminder['message']}")
+                    continue
+                by_channel.setdefault(reminder["channel_id"], []).append(reminder)
+            for channel_id, reminders in by_channel.items():
+                task = asyncio.create_task(self._send(channel_id, reminders))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+            get_store().delete_reminders(done)
+
+    async def _send(self, channel_id, reminders):
+        try:
+            channel = self._bot.get_channel(channel_id) or await self._bot.fetch_channel(channel_id)
+            for message in compose(reminders):
+                await channel.send(message)
+            logging.info(f"Sent {len(reminders)} reminders to {channel}.")
+        except Exception as e:
+            logging.error(f"Error sending reminders {[reminder['message'] for reminder in reminders]}: {e}")
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,122 @@
+import asyncio
+import random
+from collections import namedtuple
+
+import discord
+
+# Per member: the roles actually added and removed, and the error if the change failed
+RoleChangeResult = namedtuple("RoleChangeResult", ["member_id", "display_name", "added", "removed", "error"])
+
+
+class RoleChangeBatch:
+    """
+    Role changes to make, coalesced per member.
+
+    Adding and removing the same role for a member cancel out to whichever
+    came last, duplicates are dropped, and changes that would not change
+    anything (adding a role the member has) are skipped.
+    """
+
+    def __init__(self):
+        self._changes = {}  # Member ID -> (member, {role ID: role} to add, {role ID: role} to remove)
+
+    def _entry(self, member):
+        return self._changes.setdefault(member.id, (member, {}, {}))
+
+    def add(self, member, role):
+        _, to_add, to_remove = self._entry(member)
+        to_remove.pop(role.id, None)
+        if role not in member.roles:
+            to_add[role.id] = role
+
+    def remove(self, member, role):
+        _, to_add, to_remove = self._entry(member)
+        to_add.pop(role.id, None)
+        if role in member.roles:
+            to_remove[role.id] = role
+
+    def items(self):
+        """Yields (member, roles to add, roles to remove) for members with anything to change."""
+        for member, to_add, to_remove in self._changes.values():
+            if to_add or to_remove:
+                yield member, list(to_add.values()), list(to_remove.values())
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+
+class RoleExecutor:
+    """
+    Runs role changes for many members concurrently, with one
+    Member.edit(roles=...) request per member.
+
+    At most `concurrency` members are updated at a time, shared by every
+    batch, so two plans posted at once do not double the load. discord.py
+    already queues requests per rate-limit bucket and waits out 429s; a
+    request that still fails with 429 or 5xx is retried here with
+    exponential backoff and jitter. Changes for one member never overlap.
+
+    Args:
+        concurrency (int): Maximum number of members updated at the same time.
+        retries (int): Extra attempts after the first one on 429 and 5xx.
+        backoff (float): Base delay in seconds for the backoff between attempts.
+    """
+
+    def __init__(self, concurrency=5, retries=3, backoff=0.5):
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._member_locks = {}  # Member ID -> lock, so changes to one member are applied in order
+
+    async def _with_retries(self, call):
+        for attempt in range(self.retries + 1):
+            try:
+                return await call()
+            except discord.HTTPException as e:
+                if (e.status == 429 or e.status >= 500) and attempt < self.retries:
+                    await asyncio.sleep(self.backoff * (2 ** attempt) + random.uniform(0, self.backoff))
+                    continue
+                raise
+
+    async def _apply(self, member, to_add, to_remove, reason):
+        lock = self._member_locks.setdefault(member.id, asyncio.Lock())
+        try:
+            async with self._semaphore, lock:
+                # One request with the member's whole new role list, however many roles change.
+                # Built from the member's roles as they are now, without @everyone.
+                removed_ids = {role.id for role in to_remove}
+                roles = [role for role in member.roles if not role.is_default() and role.id not in removed_ids]
+                roles += [role for role in to_add if role not in roles]
+                await self._with_retries(lambda: member.edit(roles=roles, reason=reason))
+            return RoleChangeResult(member.id, member.display_name, to_add, to_remove, None)
+        except discord.Forbidden:
+            return RoleChangeResult(member.id, member.display_name, [], [], "missing permissions")
+        except Exception as e:
+            return RoleChangeResult(member.id, member.display_name, [], [], str(e) or type(e).__name__)
+
+    async def run(self, batch, reason=None):
+        """
+        Applies a RoleChangeBatch.
+
+        Returns:
+            dict: Member ID -> RoleChangeResult, for every member that had something to change.
+        """
+        results = await asyncio.gather(
+            *(self._apply(member, to_add, to_remove, reason) for member, to_add, to_remove in batch.items())
+        )
+        return {result.member_id: result for result in results}
+
+
+def summarize(results):
+    """Counts the members whose roles were added, removed or failed to change."""
+    summary = {"added": 0, "removed": 0, "failed": 0}
+    for result in results.values():
+        if result.error:
+            summary["failed"] += 1
+        else:
+            summary["added"] += bool(result.added)
+            summary["removed"] += bool(result.removed)
+    return summary
+
+
+role_executor = RoleExecutor()
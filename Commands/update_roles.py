@@ -1,20 +1,110 @@
-import csv
 import discord
 import logging
 from discord.ext import commands
+from Data_extraction.Deputy.member_snapshot import member_snapshot
+from .role_executor import RoleChangeBatch, role_executor, summarize
+from Data_extraction.Deputy.member_index import member_index
+from Data_extraction.datastore import get_store
 
-async def update_roles(ctx, csv_file_path: str, role_name: str = "Ops på jobb"):
+
+async def plan_member_ids(guild, plan_id):
+    """
+    Returns the member IDs of the people in a plan.
+
+    Uses the member ID stored with each assignment, and otherwise looks the
+    name up in the member index.
+
+    Returns:
+        The set of member IDs, and the names that could not be resolved.
+    """
+    member_ids, unresolved = set(), []
+    for assignment in await get_store().assignments(plan_id):
+        member_id = assignment['member_id'] or member_index.lookup(guild, assignment['label'])
+        if member_id:
+            member_ids.add(member_id)
+        else:
+            unresolved.append(assignment['label'])
+    return member_ids, unresolved
+
+
+async def reconcile_role(guild, role, target_ids, batch=None):
+    """
+    Makes the members in target_ids the exact holders of a role.
+
+    Only the differences are sent to Discord: the role is added to members
+    in target_ids who lack it and removed from holders not in target_ids.
+    Members who keep the role are not touched.
+
+    Args:
+        guild: The Discord guild.
+        role: The role to reconcile.
+        target_ids (set): IDs of the members who should hold the role.
+        batch (RoleChangeBatch): Optional batch to add the changes to, so
+            several roles can be applied together with apply_role_changes.
+            Without it the changes are applied right away.
+
+    Returns:
+        dict: The counts from apply_role_changes, or None if a batch was given.
+    """
+    current_ids = member_snapshot.role_holders(guild, role)
+    own_batch = batch is None
+    if own_batch:
+        batch = RoleChangeBatch()
+    for member_ids, change in ((target_ids - current_ids, batch.add), (current_ids - target_ids, batch.remove)):
+        for member_id in member_ids:
+            member = guild.get_member(member_id)
+            if member:
+                change(member, role)
+            else:
+                logging.warning(f"Member {member_id} is not in the server, cannot update role '{role.name}'.")
+    logging.info(f"Role '{role.name}': {len(current_ids & target_ids)} members keep it.")
+
+    if own_batch:
+        return await apply_role_changes(batch, reason=f"Reconciling '{role.name}'")
+
+
+async def apply_role_changes(batch, reason=None):
     """
-    Updates the roles of users in a Discord server based on a CSV file.
+    Applies a RoleChangeBatch through the shared role executor, with one
+    request per changed member however many roles change for them.
+
+    Returns:
+        dict: Counts of members with roles 'added', 'removed' and 'failed',
+        and 'results' with the RoleChangeResult per changed member.
+    """
+    results = await role_executor.run(batch, reason=reason)
+    counts = summarize(results)
+    counts['results'] = results
+
+    logging.info(
+        f"Role changes: {counts['added']} members got roles, {counts['removed']} lost roles, "
+        f"{counts['failed']} failed ({len(results)} requests)."
+    )
+    failures = {result.display_name: result.error for result in results.values() if result.error}
+    if failures:
+        logging.error(f"Could not update roles for: {failures}")
+    return counts
+
+
+async def update_roles(ctx, plan_id: int, role_name: str = "Ops på jobb", batch=None):
+    """
+    Updates the roles of users in a Discord server based on a stored plan.
 
     Args:
         ctx: The command context (for sending messages and accessing the guild).
-        csv_file_path (str): Path to the CSV file containing a list of names.
+        plan_id (int): The plan whose people are on shift.
         role_name (str): The name of the role to assign. Defaults to "Ops på jobb".
+        batch (RoleChangeBatch): Optional batch to collect the changes in (see reconcile_role).
+
+    Returns:
+        dict: The counts from reconcile_role, or None if nothing was updated or a batch was given.
     """
     guild = ctx.guild
 
     try:
+        # Role changes need every member cached; chunks the guild now if the bot just started
+        await member_snapshot.members_ready(guild)
+
         # Check if the role exists in the server
         role = discord.utils.get(guild.roles, name=role_name)
         if not role:
@@ -22,45 +112,14 @@ async def update_roles(ctx, csv_file_path: str, role_name: str = "Ops på jobb")
             await ctx.send(f"Role '{role_name}' not found in the server.")
             return
 
-        # Remove the role from all members
-        logging.info("Removing the role from all members...")
-        for member in guild.members:
-            if role in member.roles:
-                try:
-                    await member.remove_roles(role)
-                    logging.info(f"Role '{role_name}' removed from '{member.display_name}'.")
-                except discord.Forbidden:
-                    logging.error(f"Missing permissions to remove role '{role_name}' from '{member.display_name}'.")
-                except Exception as e:
-                    logging.error(f"An error occurred while removing role from '{member.display_name}': {e}")
-
-        # Read the CSV file
-        with open(csv_file_path, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.reader(file)
-            names = [row[0].strip() for row in csv_reader]  # Assuming names are in the first column
-
-        if not names:
-            logging.error("No names found in the CSV file.")
-            return
+        # Read the people in the plan
+        member_ids, unresolved = await plan_member_ids(guild, plan_id)
+        if unresolved:
+            logging.warning(f"No Discord member found for {unresolved} in plan {plan_id}.")
+        if not member_ids and not unresolved:
+            logging.warning(f"No people in plan {plan_id}, nobody keeps the role.")
+
+        return await reconcile_role(guild, role, member_ids, batch)
 
-        # Assign the role to members listed in the CSV
-        logging.info("Assigning roles based on the CSV file...")
-        for member in guild.members:
-            if member.display_name in names or member.name in names:
-                if role in member.roles:
-                    logging.info(f"User '{member.display_name}' already has the role '{role_name}'. Skipping.")
-                else:
-                    try:
-                        await member.add_roles(role)
-                        logging.info(f"Role '{role_name}' assigned to '{member.display_name}'.")
-                    except discord.Forbidden:
-                        logging.error(f"Missing permissions to assign role '{role_name}' to '{member.display_name}'.")
-                    except Exception as e:
-                        logging.error(f"An error occurred for '{member.display_name}': {e}")
-
-        logging.info("Role update process completed.")
-
-    except FileNotFoundError:
-        logging.error(f"File '{csv_file_path}' not found.")
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        logging.error(f"An unexpected error occurred: {e}")
@@ -0,0 +1,75 @@
+"""
+Benchmarks the Deputy sync against the local fake Deputy server.
+
+For every record count it runs a full sync and a delta sync, and prints
+wall time, peak Python memory (tracemalloc) and requests per sync.
+Nothing under Data/ is touched: the database and the token store go to a temp dir.
+
+Usage:
+    python -m Data_extraction.Deputy.benchmark_sync --records 10 1000 10000 50000 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from Data_extraction import datastore
+from Data_extraction.Deputy import deputy_client, token_manager
+from Data_extraction.Deputy.fake_deputy import FakeDeputy, start_server
+from Data_extraction.Deputy.update_on_shift import DepartmentSync, update_on_shift
+
+
+async def measure(fake, sync):
+    fake.reset_stats()
+    tracemalloc.start()
+    started = time.perf_counter()
+    written = await update_on_shift(sync)
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return wall, peak, dict(fake.stats), written
+
+
+async def run(record_counts, latency, error_rate, port, touched):
+    workdir = tempfile.mkdtemp(prefix="deputy-bench-")
+    datastore._store = datastore.DataStore(os.path.join(workdir, "bench.db"))
+
+    print(f"{'records':>8} {'sync':>6} {'wall s':>8} {'peak MB':>8} {'requests':>9} {'errors':>7} {'MB sent':>8}")
+    for count in record_counts:
+        fake = FakeDeputy(records=count, latency=latency, error_rate=error_rate)
+        runner = await start_server(fake, port=port)
+        # Point the shared client and token manager at the fake server
+        deputy_client._client = deputy_client.DeputyClient(f"http://127.0.0.1:{port}", backoff=0.01)
+        token_manager._token_manager = token_manager.TokenManager(
+            "bench-key", "bench-secret", store_path=os.path.join(workdir, "tokens.json")
+        )
+        token_manager._token_manager.refresh_token = "bench-refresh"
+        try:
+            sync = DepartmentSync()
+            for label in ("full", "delta"):
+                if label == "delta":
+                    fake.touch(touched)
+                wall, peak, stats, written = await measure(fake, sync)
+                print(f"{count:>8} {label:>6} {wall:>8.3f} {peak / 1e6:>8.2f} {stats['requests']:>9} "
+                      f"{stats['errors']:>7} {stats['bytes'] / 1e6:>8.2f}")
+        finally:
+            await deputy_client.close_client()
+            await runner.cleanup()
+    datastore.close_store()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Deputy sync against a local fake server.")
+    parser.add_argument("--records", type=int, nargs="+", default=[10, 1000, 10000, 50000])
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every fake response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of QUERY requests answered with 503")
+    parser.add_argument("--touched", type=int, default=5, help="Records modified between the full and delta sync")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    asyncio.run(run(args.records, args.latency, args.error_rate, args.port, args.touched))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import asyncio
+import codecs
+import contextlib
+import json
+import logging
+import os
+import random
+
+import aiohttp
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+DEPUTY_BASE_URL = os.getenv("DEPUTY_BASE_URL", "https://rydetechnology.eu.deputy.com")
+
+# Status codes that are worth retrying (rate limited or a temporary server problem)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeputyAPIError(Exception):
+    """Raised when a Deputy request fails and retrying will not help."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DeputyClient:
+    """
+    Shared asyncio client for the Deputy API.
+
+    All requests go through one pooled keep-alive aiohttp session, so the
+    Discord event loop is never blocked while Deputy answers.
+
+    Args:
+        base_url (str): Deputy install URL, e.g. https://rydetechnology.eu.deputy.com.
+        timeout (float): Seconds to wait for a connection, or for the next chunk of a response.
+        retries (int): Extra attempts after the first one on network errors, 429 and 5xx.
+        backoff (float): Base delay in seconds for the exponential backoff between attempts.
+        pool_size (int): Maximum number of open connections in the pool.
+    """
+
+    def __init__(self, base_url=DEPUTY_BASE_URL, timeout=15, retries=3, backoff=0.5, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        # No total timeout, so a long streamed response is fine as long as data keeps coming
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+        self._operational_units = {}  # (company, unit names) -> operational unit IDs
+
+    def _get_session(self):
+        """Creates the pooled session lazily, inside the running event loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def _open(self, method, path, *, headers=None, data=None, json_body=None):
+        """
+        Opens a request to Deputy and yields the response once it has a good status.
+
+        Network errors, timeouts, 429 and 5xx responses are retried with
+        exponential backoff and jitter. Other 4xx responses raise right away.
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        session = self._get_session()
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = await session.request(method, url, headers=headers, data=data, json=json_body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise DeputyAPIError(f"Request to {url} failed: {e}") from e
+                logging.warning(f"Request to {url} failed ({e}), retrying.")
+                await self._sleep(attempt)
+                continue
+
+            if response.status in RETRY_STATUSES and attempt < self.retries:
+                retry_after = response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+                response.release()
+                logging.warning(f"Deputy returned {response.status} for {url}, retrying.")
+                await self._sleep(attempt, delay)
+                continue
+            if response.status >= 400:
+                text = await response.text()
+                response.release()
+                raise DeputyAPIError(f"Deputy returned {response.status} for {url}: {text[:200]}", response.status)
+
+            try:
+                yield response
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise DeputyAPIError(f"Reading the response from {url} failed: {e}") from e
+            finally:
+                response.release()
+            return
+
+    async def request(self, method, path, *, headers=None, data=None, json_body=None):
+        """Sends a request to Deputy and returns the decoded JSON body."""
+        async with self._open(method, path, headers=headers, data=data, json_body=json_body) as response:
+            return await response.json(content_type=None)
+
+    async def _sleep(self, attempt, delay=None):
+        if delay is None:
+            delay = self.backoff * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, self.backoff))
+
+    async def post_form(self, path, payload):
+        """Posts a form-encoded payload, as used by the OAuth endpoint."""
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        return await self.request("POST", path, headers=headers, data=payload)
+
+    async def query(self, resource, payload, access_token):
+        """Runs a resource QUERY, e.g. query("Timesheet", {"search": {...}}, token)."""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        return await self.request("POST", f"/api/v1/resource/{resource}/QUERY", headers=headers, json_body=payload)
+
+    async def stream_query(self, resource, payload, access_token, transform=None):
+        """
+        Runs a resource QUERY and yields the items as they are parsed off the wire.
+
+        The response is never loaded as a whole. If transform is given, each
+        item is passed through it straight away, so only the fields it keeps
+        stay alive (the heavy _DPMetaData is dropped item by item).
+        """
+        headers = {"Authorization": f"Bearer {access_token}"}
+        path = f"/api/v1/resource/{resource}/QUERY"
+        async with self._open("POST", path, headers=headers, json_body=payload) as response:
+            async for item in iter_json_array(response.content):
+                yield transform(item) if transform else item
+
+    async def iter_query(self, resource, payload, access_token, page_size=500, transform=None):
+        """
+        Runs a resource QUERY page by page (start/max) and yields one item at a time.
+
+        Each page is streamed with stream_query, so memory follows a single
+        item rather than the page or the total number of matching records.
+        The pages are sorted by Id, since Deputy does not guarantee an order
+        otherwise and pages could overlap or skip records.
+        """
+        start = 0
+        while True:
+            count = 0
+            page = {**payload, "sort": {"Id": "asc"}, "start": start, "max": page_size}
+            async for item in self.stream_query(resource, page, access_token, transform):
+                count += 1
+                yield item
+            if count < page_size:
+                return
+            start += page_size
+
+    async def resolve_operational_units(self, company_name, labels, access_token):
+        """
+        Looks up the Deputy IDs of operational units, e.g. ("Bergen", ["[BRG] Operations"]).
+
+        If labels is None, every operational unit in the company is returned.
+        The IDs are cached on the client, since areas rarely change.
+        Returns a list of IDs, or an empty list if nothing matched.
+        """
+        # "[BRG] Operations" -> "Operations"
+        unit_names = None if labels is None else [label.split("] ", 1)[-1] for label in labels]
+        cache_key = (company_name, None if unit_names is None else tuple(sorted(unit_names)))
+        if cache_key in self._operational_units:
+            return self._operational_units[cache_key]
+
+        companies = await self.query("Company", {
+            "search": {"s1": {"field": "CompanyName", "data": company_name, "type": "eq"}}
+        }, access_token)
+        company_ids = [company["Id"] for company in companies or []]
+        if not company_ids:
+            logging.warning(f"Company '{company_name}' not found in Deputy.")
+            return []
+
+        search = {"s1": {"field": "Company", "data": company_ids, "type": "in"}}
+        if unit_names is not None:
+            search["s2"] = {"field": "OperationalUnitName", "data": unit_names, "type": "in"}
+        units = await self.query("OperationalUnit", {"search": search}, access_token)
+        unit_ids = [unit["Id"] for unit in units or []]
+        self._operational_units[cache_key] = unit_ids
+        logging.info(f"Resolved {len(unit_ids)} operational units for {company_name}: {unit_ids}")
+        return unit_ids
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+async def iter_json_array(stream, chunk_size=64 * 1024):
+    """
+    Incrementally parses a JSON array from an aiohttp stream, yielding one element at a time.
+
+    Only the unparsed tail of the response is buffered, never the whole body.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    opened = False
+
+    async def more():
+        nonlocal buffer, pos
+        chunk = await stream.read(chunk_size)
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=not chunk)
+        pos = 0
+        return bool(chunk)
+
+    def skip_whitespace():
+        nonlocal pos
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+
+    eof = not await more()
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            if eof:
+                raise DeputyAPIError("Deputy response ended before the JSON array was closed.")
+            eof = not await more()
+            continue
+
+        if not opened:
+            if buffer[pos] != "[":
+                raise DeputyAPIError(f"Expected a JSON array from Deputy, got: {buffer[pos:pos + 200]}")
+            opened = True
+            pos += 1
+            continue
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            item, end = None, None
+        # A value that runs to the very end of the buffer may be cut off, and so may a
+        # number followed by a fraction or exponent part (e.g. "1." of "1.5"), read more first
+        cut_off = end is None or end >= len(buffer) or (
+            type(item) in (int, float) and buffer[end] in ".eE"
+        )
+        if cut_off and not eof:
+            eof = not await more()
+            continue
+        if end is None:
+            raise DeputyAPIError("Could not parse the Deputy response.")
+        pos = end
+        yield item
+
+
+_client = None
+
+
+def get_client():
+    """Returns the process-wide Deputy client."""
+    global _client
+    if _client is None:
+        _client = DeputyClient()
+    return _client
+
+
+async def close_client():
+    """Closes the shared client's connection pool."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,247 @@
+"""
+Local stand-in for the Deputy API, for exercising and benchmarking the
+extractor without touching rydetechnology.eu.deputy.com.
+
+Covers the OAuth access_token endpoint and the resource QUERY endpoints we
+use (Timesheet, Roster, Company, OperationalUnit), including search
+filters, sort and start/max paging. Data is either synthetic or replayed from a
+recorded JSON file.
+
+Usage:
+    python -m Data_extraction.Deputy.fake_deputy --records 5000 --latency 0.05 --error-rate 0.02
+    DEPUTY_BASE_URL=http://127.0.0.1:8081 python app.py
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+# Companies and operational units in the synthetic data, LabelWithCompany style
+COMPANIES = {
+    1: ("Bergen", "BRG", ["Operations", "Night Shift", "Operations Training/follow up", "Management",
+                          "Mechanics", "Shiftleader", "Mechanics Training/follow up"]),
+    2: ("Stavanger", "STV", ["Operations", "Mechanics"]),
+    3: ("Oslo", "OSL", ["Operations", "Mechanics", "Warehouse"]),
+}
+
+FIRST_NAMES = ["Ola", "Kari", "Jonas", "Ingrid", "Mathias", "Sofie", "Henrik", "Nora", "Øyvind", "Åse"]
+LAST_NAMES = ["Hansen", "Johansen", "Olsen", "Larsen", "Strømme", "Reikrås", "Svendsen", "Berg", "Haugen", "Dahl"]
+
+
+def build_operational_units():
+    units = []
+    unit_id = 1
+    for company_id, (company_name, code, names) in COMPANIES.items():
+        for name in names:
+            units.append({
+                "Id": unit_id,
+                "Company": company_id,
+                "OperationalUnitName": name,
+                "CompanyName": company_name,
+                "LabelWithCompany": f"[{code}] {name}"
+            })
+            unit_id += 1
+    return units
+
+
+def build_records(count, units, seed=0):
+    """
+    Builds `count` synthetic Timesheet/Roster items for today, with the
+    same nested _DPMetaData shape (and roughly the same weight) as Deputy.
+    """
+    rng = random.Random(seed)
+    day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    employees = max(count // 3, 1)
+    records = []
+    for record_id in range(1, count + 1):
+        unit = rng.choice(units)
+        employee_id = rng.randint(1, employees)
+        start = day_start + timedelta(minutes=rng.randint(0, 23 * 60))
+        modified = (day_start - timedelta(days=1) + timedelta(minutes=record_id % 1440)).astimezone()
+        display_name = f"{FIRST_NAMES[employee_id % len(FIRST_NAMES)]} {LAST_NAMES[employee_id // len(FIRST_NAMES) % len(LAST_NAMES)]} {employee_id}"
+        records.append({
+            "Id": record_id,
+            "Employee": employee_id,
+            "OperationalUnit": unit["Id"],
+            "StartTime": int(start.timestamp()),
+            "EndTime": int((start + timedelta(hours=8)).timestamp()),
+            "Modified": modified.isoformat(timespec="seconds"),
+            "Comment": "",
+            "_DPMetaData": {
+                "System": "Timesheet",
+                "CreatorInfo": {"Id": 1, "DisplayName": "Admin", "Photo": "https://example.invalid/photo.png"},
+                "EmployeeInfo": {
+                    "Id": employee_id,
+                    "DisplayName": display_name,
+                    "EmployeeProfile": employee_id,
+                    "Employee": employee_id,
+                    "Photo": "https://example.invalid/photo.png",
+                    "Pronouns": 0,
+                    "CustomPronouns": ""
+                },
+                "OperationalUnitInfo": {
+                    "Id": unit["Id"],
+                    "OperationalUnitName": unit["OperationalUnitName"],
+                    "Company": unit["Company"],
+                    "CompanyName": unit["CompanyName"],
+                    "LabelWithCompany": unit["LabelWithCompany"]
+                }
+            }
+        })
+    return records
+
+
+def matches(item, search):
+    """Applies a Deputy QUERY search block to one item (all conditions must hold)."""
+    for condition in (search or {}).values():
+        value = item.get(condition["field"])
+        data = condition["data"]
+        kind = condition["type"]
+        if kind == "eq" and value != data:
+            return False
+        if kind == "ne" and value == data:
+            return False
+        if kind == "in" and value not in data:
+            return False
+        if kind == "gt" and not (value is not None and value > data):
+            return False
+        if kind == "ge" and not (value is not None and value >= data):
+            return False
+        if kind == "lt" and not (value is not None and value < data):
+            return False
+        if kind == "le" and not (value is not None and value <= data):
+            return False
+    return True
+
+
+class FakeDeputy:
+    """
+    The fake server's state.
+
+    Args:
+        records (int): Number of synthetic Timesheet items (Roster gets half as many).
+        latency (float): Seconds added to every response.
+        error_rate (float): Share of QUERY requests answered with 503.
+        replay (str): Optional JSON file with {"Timesheet": [...], "Roster": [...]} to serve instead.
+        default_page_size (int): Page size when a QUERY does not send "max" (Deputy uses 500).
+    """
+
+    def __init__(self, records=1000, latency=0.0, error_rate=0.0, replay=None, default_page_size=500, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.default_page_size = default_page_size
+        self.rng = random.Random(seed)
+        self.operational_units = build_operational_units()
+        self.companies = [{"Id": company_id, "CompanyName": name, "Code": code}
+                          for company_id, (name, code, _) in COMPANIES.items()]
+        if replay:
+            with open(replay, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            self.resources = {"Timesheet": data.get("Timesheet", []), "Roster": data.get("Roster", [])}
+        else:
+            units = self.operational_units
+            self.resources = {
+                "Timesheet": build_records(records, units, seed),
+                "Roster": build_records(records // 2, units, seed + 1)
+            }
+        self.resources["Company"] = self.companies
+        self.resources["OperationalUnit"] = self.operational_units
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+        self.token_counter = 0
+
+    def reset_stats(self):
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def access_token(self, request):
+        self.stats["requests"] += 1
+        await self._delay()
+        form = await request.post()
+        if form.get("grant_type") != "refresh_token" or not form.get("refresh_token"):
+            return web.json_response({"error": "invalid_grant"}, status=400)
+        self.token_counter += 1
+        return web.json_response({
+            "access_token": f"fake-access-{self.token_counter}",
+            "refresh_token": f"fake-refresh-{self.token_counter}",
+            "expires_in": 86400,
+            "scope": "longlife_refresh_token",
+            "endpoint": str(request.url.origin())
+        })
+
+    async def query(self, request):
+        self.stats["requests"] += 1
+        await self._delay()
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"error": "Unauthorized"}, status=401)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": "Service Unavailable"}, status=503)
+
+        resource = request.match_info["resource"]
+        if resource not in self.resources:
+            return web.json_response({"error": f"Unknown resource {resource}"}, status=404)
+
+        payload = await request.json()
+        start = int(payload.get("start", 0))
+        page_size = int(payload.get("max", self.default_page_size))
+        found = [item for item in self.resources[resource] if matches(item, payload.get("search"))]
+        sort = payload.get("sort")
+        if sort:
+            # Stable sorts, last field first, so the first field decides
+            for field, direction in reversed(list(sort.items())):
+                found.sort(key=lambda item: item.get(field), reverse=str(direction).lower() == "desc")
+        else:
+            # Like Deputy, no order is guaranteed without a sort
+            self.rng.shuffle(found)
+        body = json.dumps(found[start:start + page_size])
+        self.stats["bytes"] += len(body)
+        return web.Response(text=body, content_type="application/json")
+
+    async def get_stats(self, request):
+        return web.json_response(self.stats)
+
+    def touch(self, count, resource="Timesheet"):
+        """Marks `count` records as modified now, to exercise delta syncs."""
+        modified = datetime.now().astimezone().isoformat(timespec="seconds")
+        for item in self.resources[resource][:count]:
+            item["Modified"] = modified
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/oauth/access_token", self.access_token)
+        app.router.add_post("/api/v1/resource/{resource}/QUERY", self.query)
+        app.router.add_get("/_stats", self.get_stats)
+        return app
+
+
+async def start_server(fake, host="127.0.0.1", port=8081):
+    """Starts the fake server in the running event loop and returns its runner."""
+    runner = web.AppRunner(fake.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Deputy API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--records", type=int, default=1000, help="Number of synthetic Timesheet items")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of QUERY requests answered with 503")
+    parser.add_argument("--replay", help="JSON file with recorded Timesheet/Roster items")
+    args = parser.parse_args()
+
+    fake = FakeDeputy(args.records, args.latency, args.error_rate, args.replay)
+    print(f"Fake Deputy on http://{args.host}:{args.port} with {len(fake.resources['Timesheet'])} timesheets")
+    web.run_app(fake.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import csv
+import json
+import logging
+import time
+
+from Data_extraction.Deputy.member_index import normalize_name
+from Data_extraction.datastore import get_store
+
+IDENTITY_STORE_PATH = "Data/Deputy/identities.json"  # Old JSON store, imported into the database once
+SEED_FILES = ["Data/Deputy/Stavanger_Deputy.csv"]  # label + phone (holds the Discord ID)
+
+
+class IdentityStore:
+    """
+    Persistent table of Deputy employee ID -> Discord user ID.
+
+    match_names checks it first, so only employees we have never matched
+    fall through to name matching. Entries come from exact matches, manual
+    confirmations (!confirmmatch) and the Discord IDs already kept in the
+    'phone' column of the seed CSVs (keyed by name until the employee's
+    Deputy ID is seen). Entries for a member who leaves the guild are dropped.
+
+    The entries are held in memory and stored in the data store's
+    identities and identity_names tables; load() must run (at on_ready)
+    before the first match.
+
+    Args:
+        json_path (str): Old JSON store to import if the tables are empty.
+        seed_files (list): CSV files with 'label' and 'phone' (Discord ID) columns.
+    """
+
+    def __init__(self, json_path=IDENTITY_STORE_PATH, seed_files=SEED_FILES):
+        self.json_path = json_path
+        self.identities = {}  # Deputy employee ID (str) -> {"discord_id", "name", "source", "updated_at"}
+        self.by_name = {}  # Normalized name -> Discord ID, for known people without an employee ID yet
+        self._changed = set()  # Employee IDs changed with save=False that are not stored yet
+        for seed_file in seed_files:
+            self._load_seed(seed_file)
+
+    @property
+    def dirty(self):
+        """Whether there are changes made with save=False that are not stored yet."""
+        return bool(self._changed)
+
+    async def load(self):
+        identities, by_name = await get_store().identities()
+        if not identities and not by_name:
+            identities, by_name = self._load_json()
+            if identities or by_name:
+                get_store().write_identities(identities, by_name)
+                logging.info(f"Imported {len(identities)} identities from {self.json_path}.")
+        self.identities.update(identities)
+        for name, discord_id in by_name.items():
+            self.by_name[name] = discord_id
+        logging.info(f"Loaded {len(self.identities)} identities.")
+
+    def _load_json(self):
+        try:
+            with open(self.json_path, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            return data.get("identities", {}), {name: int(discord_id) for name, discord_id in data.get("by_name", {}).items()}
+        except FileNotFoundError:
+            return {}, {}
+        except (ValueError, OSError) as e:
+            logging.error(f"Error reading identity store {self.json_path}: {e}")
+            return {}, {}
+
+    def _load_seed(self, seed_file):
+        try:
+            with open(seed_file, mode="r", encoding="utf-8") as file:
+                for row in csv.DictReader(file):
+                    discord_id = (row.get("phone") or "").strip()
+                    name = normalize_name(row.get("label"))
+                    if name and discord_id.isdigit():
+                        self.by_name.setdefault(name, int(discord_id))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Error reading identity seed {seed_file}: {e}")
+
+    def save(self):
+        """Queues the changes made with save=False for writing to the data store."""
+        changed = {key: self.identities[key] for key in self._changed if key in self.identities}
+        self._changed.clear()
+        if changed:
+            get_store().write_identities(changed)
+
+    def get(self, employee_id, name=None, save=True):
+        """
+        Returns the Discord ID for a Deputy employee, or None if unknown.
+
+        A name-keyed seed entry is bound to the employee ID on first use.
+        """
+        if employee_id is not None:
+            identity = self.identities.get(str(employee_id))
+            if identity:
+                return identity["discord_id"]
+        discord_id = self.by_name.get(normalize_name(name)) if name else None
+        if discord_id and employee_id is not None:
+            self.remember(employee_id, discord_id, name, "seed", save)
+        return discord_id
+
+    def remember(self, employee_id, discord_id, name, source, save=True):
+        """
+        Stores a match. source is "exact", "manual" or "seed". Pass save=False
+        to batch several changes into one save() (see dirty).
+        """
+        key = str(employee_id)
+        current = self.identities.get(key)
+        if current and current["discord_id"] == discord_id:
+            return
+        self.identities[key] = {"discord_id": discord_id, "name": name, "source": source, "updated_at": int(time.time())}
+        self._changed.add(key)
+        if save:
+            self.save()
+
+    def remember_name(self, name, discord_id):
+        """Stores a match for someone whose Deputy employee ID we do not know (yet)."""
+        self.by_name[normalize_name(name)] = discord_id
+        get_store().write_identities(names={normalize_name(name): discord_id})
+
+    def forget(self, employee_id):
+        if self.identities.pop(str(employee_id), None):
+            get_store().delete_identities(employee_ids=[str(employee_id)])
+
+    def forget_member(self, discord_id):
+        """Drops every entry pointing at a Discord user, e.g. when they leave the guild."""
+        stale = [key for key, identity in self.identities.items() if identity["discord_id"] == discord_id]
+        names = [name for name, known_id in self.by_name.items() if known_id == discord_id]
+        for key in stale:
+            del self.identities[key]
+        for name in names:
+            del self.by_name[name]
+        if stale or names:
+            get_store().delete_identities(stale, names)
+            logging.info(f"Forgot {len(stale)} identities for departed member {discord_id}.")
+
+
+identity_store = IdentityStore()
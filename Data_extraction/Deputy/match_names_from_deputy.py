@@ -1,92 +1,55 @@
-import csv
 import logging
-import discord
+from Data_extraction.Deputy.member_index import member_index
+from Data_extraction.Deputy.identity_store import identity_store
+from Data_extraction.models import Person
 
-async def match_and_update(ctx, deputy_file, output_file):
-    """
-    Matches nicknames from Stavanger_Deputy.csv to Discord members dynamically,
-    and writes updated data to the specified output file.
+# Guild ID -> {Deputy name: (employee ID, MatchResult)} for names from the
+# latest matching that were ambiguous or only fuzzily matched, for manual confirmation
+match_reports = {}
 
-    Args:
-        ctx: The Discord context.
-        deputy_file: Path to the Stavanger_Deputy.csv file.
-        output_file: Path to the output CSV file.
+def match_names(guild, people):
     """
-    guild = ctx.guild  # The server (guild) where the command is executed
+    Matches Deputy employees to Discord members, without reading or writing roster files.
 
-    # Fetch all Discord members with nicknames
-    discord_members = [
-        {
-            "nickname": member.display_name,  # Server-specific nickname
-            "user_id": str(member.id),       # Plain user ID without @
-            "username": f"@{member.id}"      # User ID with @ for username
-        }
-        for member in guild.members
-    ]
-    #logging.info(f"Discord members in {guild.name}: {discord_members}")
+    Known employees are looked up in the identity store first; only the
+    rest are matched by name. Exact name matches are saved to the store.
 
-    # Read the deputy file
-    deputy_data = read_csv(deputy_file)
-    logging.info(f"Read {len(deputy_data)} entries from {deputy_file}.")
+    Args:
+        guild: The Discord guild.
+        people: (employee ID, display name) pairs. The ID may be None.
 
+    Returns:
+        The matched people as a list of Person.
+    """
     # Prepare the output data
     output_data = []
-    """
-    for row in deputy_data:
-        nickname = row['label']  # Nickname from Stavanger_Deputy.csv
-        matched_member = next((m for m in discord_members if m['nickname'] == nickname), None)
 
-        # Prepare the entry
-        entry = {
-            'label': nickname,
-            'value': matched_member['user_id'] if matched_member else 'Not matched',  # No @
-            'username': matched_member['username'] if matched_member else 'Not matched'  # With @
-        }
-        output_data.append(entry)"""
-    
-    for index, row in enumerate(deputy_data):
-        nickname = row['label']  # Nickname from the CSV
-        matched_member = next((m for m in discord_members if m['nickname'] == nickname), None)
+    report = match_reports.setdefault(guild.id, {})
+    for index, (employee_id, nickname) in enumerate(people):
+        # Someone we have matched before, and who is still in the guild
+        member_id = identity_store.get(employee_id, nickname, save=False)
+        if member_id and member_index.contains(guild, member_id):
+            report.pop(nickname, None)
+        else:
+            # Exact match is one dictionary lookup, otherwise a fuzzy match over a few candidates
+            result = member_index.match(guild, nickname)
+            member_id = result.member_id
+            if result.status in ("fuzzy", "ambiguous"):
+                report[nickname] = (employee_id, result)
+            else:
+                report.pop(nickname, None)
+            if result.status == "exact" and employee_id is not None:
+                identity_store.remember(employee_id, member_id, nickname, "exact", save=False)
 
         # Generate a unique value if no match is found
-        value = matched_member['user_id'] if matched_member else f"unmatched_{index}"
-        username = matched_member['username'] if matched_member else "Not matched"
-
-        # Prepare the entry
-        entry = {
-            'label': nickname,
-            'value': value,  # Unique ID for dropdown
-            'username': username
-        }
-        output_data.append(entry)
-
-    # Log the data to be written
-    #logging.debug(f"Data to write to {output_file}: {output_data}")
-
-    # Write to the specified output file
-    write_csv(output_file, output_data, fieldnames=['label', 'value', 'username'])
-    logging.info(f"Data written to {output_file} successfully.")
+        value = str(member_id) if member_id else f"unmatched_{index}"  # Plain user ID without @
+        output_data.append(Person(nickname, value, member_id, employee_id))
 
-def read_csv(file_path):
-    """Reads a CSV file and returns a list of dictionaries."""
-    options = []
-    try:
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                options.append(row)
-    except Exception as e:
-        logging.error(f"Error reading CSV: {e}")
-    return options
+    # Save the new identities in one go
+    if identity_store.dirty:
+        identity_store.save()
 
-def write_csv(file_path, data, fieldnames):
-    """Writes data to a CSV file."""
-    try:
-        with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
-        logging.info(f"Data successfully written to {file_path}.")
-    except Exception as e:
-        logging.error(f"Error writing to CSV at {file_path}: {e}")
-        raise
+    ambiguous = [name for name, (_, result) in report.items() if result.status == "ambiguous"]
+    if ambiguous:
+        logging.warning(f"Ambiguous matches in {guild.name}, confirm them manually: {ambiguous}")
+    return output_data
@@ -0,0 +1,216 @@
+import logging
+import re
+import unicodedata
+from collections import Counter, namedtuple
+from Data_extraction.Deputy.member_snapshot import member_snapshot
+
+MATCH_THRESHOLD = 0.75  # Lowest fuzzy score accepted as a match
+AMBIGUITY_MARGIN = 0.1  # A runner-up this close to the best score makes the match ambiguous
+MAX_CANDIDATES = 20  # Members scored per name, picked by shared n-grams
+
+# status is "exact", "fuzzy", "ambiguous" or "none"; candidates is [(member ID, score)], best first
+MatchResult = namedtuple("MatchResult", ["member_id", "score", "status", "candidates"])
+
+# Letters that NFKD does not split into a base letter + accent
+FOLDED_LETTERS = str.maketrans({"æ": "ae", "ø": "o", "đ": "d", "ł": "l", "ß": "ss"})
+
+
+def normalize_name(name):
+    """
+    Normalizes a name for matching: NFC (so a composed and a decomposed 'å'
+    are the same), casefolded and with whitespace collapsed.
+    """
+    if not name:
+        return ""
+    return " ".join(unicodedata.normalize("NFC", name).casefold().split())
+
+
+def fold_name(name):
+    """
+    Folds a name further for fuzzy matching: accents removed and æ/ø/å
+    spelled out, so "Reikrås" and "Reikras" look alike.
+    """
+    name = normalize_name(name).translate(FOLDED_LETTERS)
+    return "".join(char for char in unicodedata.normalize("NFKD", name) if not unicodedata.combining(char))
+
+
+def name_tokens(folded):
+    return re.findall(r"\w+", folded)
+
+
+def trigrams(folded):
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def token_score(query_tokens, candidate_tokens):
+    """
+    Share of the candidate's name parts found in the Deputy name, e.g.
+    "Christian Modahl" or "Christian M" in "Christian Kyrre Strømme Modahl".
+    Single-part names score lower, since they say less about who it is: a
+    member called just "Kari" scores 0.7, below MATCH_THRESHOLD, so it is
+    never accepted for "Kari Olsen" without confirmation.
+    """
+    if not candidate_tokens:
+        return 0.0
+    matched = sum(
+        1 for token in candidate_tokens
+        if any(query == token or ((len(token) == 1 or len(token) >= 3) and query.startswith(token)) for query in query_tokens)
+    )
+    return matched / len(candidate_tokens) * min(1.0, 0.2 + matched / 2)
+
+
+def similarity(query, candidate):
+    """Scores a folded Deputy name against a folded member name, 0 to 1."""
+    query_grams, candidate_grams = trigrams(query), trigrams(candidate)
+    dice = 2 * len(query_grams & candidate_grams) / (len(query_grams) + len(candidate_grams))
+    return max(dice, token_score(name_tokens(query), name_tokens(candidate)))
+
+
+def member_names(member):
+    """The names a member can be matched on: server nickname/display name, global name and username."""
+    names = {normalize_name(member.display_name), normalize_name(getattr(member, "global_name", None)), normalize_name(member.name)}
+    names.discard("")
+    return names
+
+
+class MemberIndex:
+    """
+    Per-guild hash index from normalized name to Discord member IDs.
+
+    Built once per guild (at on_ready) and kept current from the member
+    events, so matching a Deputy name is one dictionary lookup instead of a
+    scan over guild.members. Until a guild is chunked it is built from the
+    member snapshot, and rebuilt from the member cache once it is.
+
+    For names that do not match exactly, a character trigram inverted index
+    picks a few candidates that share the most trigrams, which are then
+    scored (see match()).
+    """
+
+    def __init__(self):
+        self._by_name = {}  # Guild ID -> normalized name -> set of member IDs
+        self._names = {}  # Guild ID -> member ID -> normalized names indexed for that member
+        self._grams = {}  # Guild ID -> trigram -> set of member IDs
+        self._folded = {}  # Guild ID -> member ID -> folded names, for scoring
+
+    def is_built(self, guild_id):
+        return guild_id in self._by_name
+
+    def build(self, guild):
+        members = {member.id: member for member in guild.members}
+        if not guild.chunked:
+            # Not all members are cached yet, fill in from the last snapshot
+            members = {**member_snapshot.members(guild.id), **members}
+
+        self._by_name[guild.id] = {}
+        self._names[guild.id] = {}
+        self._grams[guild.id] = {}
+        self._folded[guild.id] = {}
+        for member in members.values():
+            self._add(guild.id, member)
+        source = "member cache" if guild.chunked else "member snapshot"
+        logging.info(f"Indexed {len(self._names[guild.id])} members in {guild.name} from the {source}.")
+
+    def add(self, member):
+        self._add(member.guild.id, member)
+
+    def _add(self, guild_id, member):
+        if guild_id not in self._by_name:
+            return  # The whole guild is indexed on first use
+        names = member_names(member)
+        self._names[guild_id][member.id] = names
+        by_name = self._by_name[guild_id]
+        for name in names:
+            by_name.setdefault(name, set()).add(member.id)
+
+        folded = {fold_name(name) for name in names}
+        self._folded[guild_id][member.id] = folded
+        grams = self._grams[guild_id]
+        for gram in set().union(*(trigrams(name) for name in folded)):
+            grams.setdefault(gram, set()).add(member.id)
+
+    def remove(self, member):
+        guild_id = member.guild.id
+        names = self._names.get(guild_id, {}).pop(member.id, set())
+        by_name = self._by_name.get(guild_id, {})
+        for name in names:
+            ids = by_name.get(name)
+            if ids:
+                ids.discard(member.id)
+                if not ids:
+                    del by_name[name]
+
+        folded = self._folded.get(guild_id, {}).pop(member.id, set())
+        grams = self._grams.get(guild_id, {})
+        for gram in set().union(*(trigrams(name) for name in folded)):
+            ids = grams.get(gram)
+            if ids:
+                ids.discard(member.id)
+                if not ids:
+                    del grams[gram]
+
+    def update(self, member):
+        """Re-indexes a member whose nickname, global name or username may have changed."""
+        self.remove(member)
+        self.add(member)
+
+    def contains(self, guild, member_id):
+        """Whether a member is in the guild, also before the guild is chunked."""
+        if not self.is_built(guild.id):
+            self.build(guild)
+        return member_id in self._names[guild.id]
+
+    def lookup(self, guild, name):
+        """
+        Returns the ID of the member with this name, or None if there is no
+        member or more than one with it.
+        """
+        if not self.is_built(guild.id):
+            self.build(guild)
+        ids = self._by_name[guild.id].get(normalize_name(name))
+        if ids and len(ids) == 1:
+            return next(iter(ids))
+        return None
+
+    def match(self, guild, name):
+        """
+        Matches a Deputy display name to a member: exactly if possible,
+        otherwise by fuzzy score.
+
+        Candidates come from the trigram index, so only a handful of members
+        are scored however large the guild is. The best candidate is
+        accepted if it scores at least MATCH_THRESHOLD and no other
+        candidate is within AMBIGUITY_MARGIN of it. If another candidate is
+        that close, or the best one falls short of the threshold by less than
+        AMBIGUITY_MARGIN (e.g. a single-part name), the result is "ambiguous"
+        (for manual confirmation); otherwise it is "none".
+        """
+        member_id = self.lookup(guild, name)
+        if member_id:
+            return MatchResult(member_id, 1.0, "exact", [(member_id, 1.0)])
+
+        query = fold_name(name)
+        grams = self._grams[guild.id]
+        hits = Counter()
+        for gram in trigrams(query):
+            hits.update(grams.get(gram, ()))
+
+        folded = self._folded[guild.id]
+        scored = sorted(
+            ((member_id, max(similarity(query, candidate) for candidate in folded[member_id]))
+             for member_id, _ in hits.most_common(MAX_CANDIDATES)),
+            key=lambda pair: pair[1],
+            reverse=True
+        )
+        candidates = [pair for pair in scored if pair[1] >= MATCH_THRESHOLD - AMBIGUITY_MARGIN]
+        if not candidates:
+            return MatchResult(None, scored[0][1] if scored else 0.0, "none", candidates)
+        if scored[0][1] < MATCH_THRESHOLD:
+            return MatchResult(None, scored[0][1], "ambiguous", candidates)
+        if len(scored) > 1 and scored[0][1] - scored[1][1] < AMBIGUITY_MARGIN:
+            return MatchResult(None, scored[0][1], "ambiguous", candidates)
+        return MatchResult(scored[0][0], scored[0][1], "fuzzy", candidates)
+
+
+member_index = MemberIndex()
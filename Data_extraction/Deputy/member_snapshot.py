@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import time
+from collections import namedtuple
+
+from Data_extraction.json_files import write_json_atomic
+
+MEMBER_SNAPSHOT_PATH = "Data/Deputy/members.json"
+# Roles the plan commands hand out (update_roles and update_skiftleder_roles)
+SNAPSHOT_ROLES = ["Ops på jobb", "Nivel"]
+
+# What we keep of a member between restarts; enough to match names and to
+# know who holds the on-shift roles, without waiting for guild chunking
+SnapshotMember = namedtuple("SnapshotMember", ["id", "display_name", "global_name", "name", "role_ids"])
+
+
+class MemberSnapshot:
+    """
+    Compact on-disk copy of each guild's members.
+
+    The bot starts without chunking (chunk_guilds_at_startup=False), serves
+    name lookups from the snapshot straight away and chunks every guild in
+    the background. When a guild is chunked the snapshot is written again.
+
+    Code that needs real Member objects (role updates) awaits
+    members_ready(guild), which chunks the guild on demand if the background
+    chunk has not got to it yet.
+
+    Args:
+        store_path (str): Path to the JSON snapshot.
+        role_names (list): Names of the roles whose holders are kept.
+    """
+
+    def __init__(self, store_path=MEMBER_SNAPSHOT_PATH, role_names=SNAPSHOT_ROLES):
+        self.store_path = store_path
+        self.role_names = role_names
+        self.guilds = {}  # Guild ID -> {"saved_at": ts, "members": {member ID: SnapshotMember}}
+        self._chunking = {}  # Guild ID -> running chunk task
+        self._on_chunked = {}  # Guild ID -> callback for when the guild is chunked
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.store_path, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            for guild_id, guild in data.items():
+                members = {
+                    int(member_id): SnapshotMember(int(member_id), *fields)
+                    for member_id, fields in guild["members"].items()
+                }
+                self.guilds[int(guild_id)] = {"saved_at": guild["saved_at"], "members": members}
+            logging.info(f"Loaded member snapshots for {len(self.guilds)} guilds from {self.store_path}.")
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            logging.error(f"Error reading member snapshot {self.store_path}: {e}")
+
+    def members(self, guild_id):
+        """Returns the snapshot's {member ID: SnapshotMember} for a guild, empty if there is none."""
+        return self.guilds.get(guild_id, {}).get("members", {})
+
+    def role_holders(self, guild, role):
+        """
+        Returns the IDs of the members holding a role: from the member cache
+        once the guild is chunked, from the snapshot before that.
+        """
+        if guild.chunked:
+            return {member.id for member in role.members}
+        return {member.id for member in self.members(guild.id).values() if role.id in member.role_ids}
+
+    async def capture(self, guild):
+        """Takes a new snapshot of a (chunked) guild and writes it to disk in a worker thread."""
+        role_ids = {role.id for role in guild.roles if role.name in self.role_names}
+        members = {
+            member.id: SnapshotMember(
+                member.id, member.display_name, member.global_name, member.name,
+                [role.id for role in member.roles if role.id in role_ids]
+            )
+            for member in guild.members
+        }
+        self.guilds[guild.id] = {"saved_at": int(time.time()), "members": members}
+        await self.save()
+        logging.info(f"Saved a snapshot of {len(members)} members in {guild.name}.")
+
+    async def save(self):
+        """Writes the snapshot atomically, off the event loop."""
+        # The guild entries are replaced, never changed, so a shallow copy is a consistent snapshot
+        await asyncio.to_thread(self._write, dict(self.guilds))
+
+    def _write(self, guilds):
+        data = {
+            str(guild_id): {
+                "saved_at": guild["saved_at"],
+                "members": {str(member.id): list(member[1:]) for member in guild["members"].values()}
+            }
+            for guild_id, guild in guilds.items()
+        }
+        write_json_atomic(self.store_path, data, ensure_ascii=False)
+
+    def chunk_in_background(self, guild, on_chunked=None):
+        """
+        Starts chunking a guild unless it is chunked or already being
+        chunked. on_chunked(guild) is called once the member cache is full,
+        before the snapshot is taken; it is kept for later (on-demand) chunks.
+        """
+        if on_chunked:
+            self._on_chunked[guild.id] = on_chunked
+        if guild.chunked or guild.id in self._chunking:
+            return self._chunking.get(guild.id)
+
+        async def run():
+            try:
+                started = time.perf_counter()
+                await guild.chunk()
+                logging.info(f"Chunked {guild.member_count} members in {guild.name} in {time.perf_counter() - started:.1f}s.")
+                if guild.id in self._on_chunked:
+                    self._on_chunked[guild.id](guild)
+                await self.capture(guild)
+            except Exception as e:
+                logging.error(f"Error chunking members in {guild.name}: {e}")
+            finally:
+                self._chunking.pop(guild.id, None)
+
+        task = asyncio.create_task(run())
+        self._chunking[guild.id] = task
+        return task
+
+    async def members_ready(self, guild):
+        """Waits until the guild's member cache is full, chunking it now if needed."""
+        if guild.chunked:
+            return
+        task = self._chunking.get(guild.id) or self.chunk_in_background(guild)
+        if task:
+            await asyncio.shield(task)
+
+
+member_snapshot = MemberSnapshot()
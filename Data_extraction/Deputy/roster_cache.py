@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from Data_extraction.Deputy.update_on_shift import update_on_shift, department_sync
+from Data_extraction.Deputy.match_names_from_deputy import match_names
+from Data_extraction.Deputy.shifts import shift_of, shift_start
+from Data_extraction.datastore import get_store
+
+REFRESH_INTERVAL = 5 * 60  # Seconds before a cached roster counts as stale
+
+# The departments kept warm for the plan commands
+ROSTERS = ["ops", "mech"]
+
+
+def last_shift_boundary(now=None):
+    """Returns the Unix time the current shift started (06, 14 or 22, see shifts.SHIFTS)."""
+    now = now or datetime.now()
+    return shift_start(*shift_of(now.timestamp())).timestamp()
+
+
+def format_roster_age(updated_at):
+    """Formats how old a cached roster is, e.g. 'for 3 min siden'."""
+    minutes = int((time.time() - updated_at) // 60)
+    if minutes < 1:
+        return "akkurat nå"
+    return f"for {minutes} min siden"
+
+
+class RosterCache:
+    """
+    Keeps the current shift's matched ops and mech rosters warm in memory.
+
+    Commands get the cached roster right away. If it is stale (older than
+    refresh_interval, or from before the last shift start) a refresh is
+    started in the background and the next command gets the new data
+    (stale-while-revalidate). Only the very first command has to wait.
+    A roster's age is the time of the last successful Deputy sync, so a
+    failed sync leaves it stale and it is retried on the next prefetch.
+    Until Deputy has answered once (e.g. it is down at boot), the rosters
+    stored by the last run are served instead.
+    One refresh syncs Deputy once and matches every roster kind for the guild;
+    guilds refreshing at the same time share one sync (see DepartmentSync.sync).
+
+    Args:
+        refresh_interval (int): Seconds before a cached roster counts as stale.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._entries = {}  # (guild ID, kind) -> (people, updated_at), updated_at None if Deputy never synced
+        self._refreshing = {}  # guild ID -> running refresh task
+
+    def is_stale(self, guild, kind):
+        entry = self._entries.get((guild.id, kind))
+        if entry is None:
+            return True
+        updated_at = entry[1]
+        if updated_at is None or time.time() - updated_at > self.refresh_interval:
+            return True
+        return updated_at < last_shift_boundary()
+
+    def is_any_stale(self, guild):
+        return any(self.is_stale(guild, kind) for kind in ROSTERS)
+
+    async def get(self, guild, kind):
+        """
+        Returns (people, updated_at) for a roster kind ("ops" or "mech"),
+        for the shift that is on now (e.g. at 02:00 the night shift that
+        started at 22:00 yesterday).
+
+        Waits for Deputy only if nothing is cached yet.
+        """
+        entry = self._entries.get((guild.id, kind))
+        if entry is None:
+            await self.refresh(guild)
+            return self._entries[(guild.id, kind)]
+        if self.is_stale(guild, kind):
+            self.refresh_in_background(guild)
+        return entry
+
+    async def get_shift(self, guild, kind, day, shift):
+        """
+        Returns (people, updated_at) for one (date, shift), e.g. tomorrow's
+        "kveld". Served from the synced window in memory, no Deputy call
+        unless nothing has been synced yet.
+        """
+        if (guild.id, kind) not in self._entries:
+            await self.refresh(guild)
+        elif self.is_stale(guild, kind):
+            self.refresh_in_background(guild)
+        people = match_names(guild, department_sync.people_on(kind, day, shift))
+        return people, self._entries[(guild.id, kind)][1]
+
+    async def refresh(self, guild):
+        """Refreshes every roster for a guild now. Concurrent callers share the same refresh."""
+        await asyncio.shield(self._start_refresh(guild))
+
+    def refresh_in_background(self, guild):
+        task = self._start_refresh(guild)
+        task.add_done_callback(self._log_failure)
+
+    def _start_refresh(self, guild):
+        task = self._refreshing.get(guild.id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refresh(guild))
+            self._refreshing[guild.id] = task
+        return task
+
+    async def _refresh(self, guild):
+        started = time.perf_counter()
+        refresh_started_at = time.time()
+        await update_on_shift()
+        if department_sync.synced_at is None or department_sync.synced_at < refresh_started_at:
+            logging.warning(f"Deputy sync for {guild.name} failed, the rosters stay stale until the next refresh.")
+        day, shift = shift_of(time.time())
+        for kind in ROSTERS:
+            if department_sync.synced_at is None:
+                # Nothing synced since the start, fall back to the roster stored for the shift's day
+                people = match_names(guild, await get_store().roster(kind, day))
+            else:
+                people = match_names(guild, department_sync.people_on(kind, day, shift))
+            self._entries[(guild.id, kind)] = (people, department_sync.synced_at)
+            logging.info(f"Refreshed {kind} roster for {guild.name} ({len(people)} people).")
+        logging.info(f"Roster refresh for {guild.name} took {time.perf_counter() - started:.2f}s.")
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception():
+            logging.error(f"Background roster refresh failed: {task.exception()}")
+
+
+roster_cache = RosterCache()
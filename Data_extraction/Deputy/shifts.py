@@ -0,0 +1,97 @@
+import re
+from datetime import datetime, date, time, timedelta
+
+# Shift name -> (start hour, end hour). Same hour ranges as the shift text in
+# opsplan/mechplan; the night shift runs past midnight into the next day.
+SHIFTS = {
+    "tidlig": (6, 14),
+    "kveld": (14, 22),
+    "natt": (22, 30)
+}
+
+# A date like "24.12", "24.12." or "24/12"
+DATE_PATTERN = re.compile(r"(\d{1,2})[./](\d{1,2})\.?")
+
+
+def shift_of(timestamp):
+    """
+    Returns the (date, shift) a Unix timestamp falls in. Times before 06:00
+    belong to the previous day's night shift.
+    """
+    moment = datetime.fromtimestamp(timestamp)
+    if moment.hour < 6:
+        return (moment - timedelta(days=1)).date(), "natt"
+    for shift, (start, end) in SHIFTS.items():
+        if start <= moment.hour < end:
+            return moment.date(), shift
+    return moment.date(), "natt"
+
+
+def shift_start(day, shift):
+    """Returns the datetime a shift starts, e.g. (date, "kveld") -> 14:00 that day."""
+    return datetime.combine(day, time()) + timedelta(hours=SHIFTS[shift][0])
+
+
+def shift_keys(start_time, end_time=None):
+    """
+    Returns every (date, shift) a record from start_time to end_time overlaps,
+    so someone working 10-18 is on both the early and the evening shift.
+    """
+    if not start_time:
+        return []
+    if not end_time or end_time <= start_time:
+        return [shift_of(start_time)]
+
+    keys = []
+    day, shift = shift_of(start_time)
+    current = shift_start(day, shift)
+    end = datetime.fromtimestamp(end_time)
+    while current < end:
+        keys.append(shift_of(current.timestamp()))
+        current += timedelta(hours=8)
+    return keys
+
+
+def parse_shift_args(args, now=None):
+    """
+    Parses command arguments like "kveld", "i morgen natt" or "24.12 tidlig".
+
+    Returns (date, shift), or None if no shift was given. A shift without a
+    date is the current or next shift with that name, so "natt" at 02:00 is
+    the night shift that started at 22:00 yesterday, and "tidlig" at 15:00
+    is tomorrow's.
+
+    Raises:
+        ValueError: If a date cannot be read, e.g. "31.02" or "24-12", or
+            is given without a shift.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    words = " ".join(args).lower().split()
+    shift = next((word for word in words if word in SHIFTS), None)
+    if shift is None:
+        if any(char.isdigit() for char in "".join(words)):
+            raise ValueError("Give the shift too, e.g. 24.12 tidlig.")
+        return None
+
+    current_day, current_shift = shift_of(now.timestamp())
+    order = list(SHIFTS)
+    day = current_day
+    if order.index(shift) < order.index(current_shift):
+        day = current_day + timedelta(days=1)
+    if "imorgen" in words or ("i" in words and "morgen" in words):
+        day = today + timedelta(days=1)
+    elif "igår" in words or ("i" in words and "går" in words):
+        day = today - timedelta(days=1)
+    else:
+        for word in words:
+            if not any(char.isdigit() for char in word):
+                continue
+            match = DATE_PATTERN.fullmatch(word)
+            try:
+                if not match:
+                    raise ValueError
+                day = date(today.year, int(match.group(2)), int(match.group(1)))
+            except ValueError:
+                raise ValueError(f"Could not read the date '{word}', write it like 24.12.") from None
+    return day, shift
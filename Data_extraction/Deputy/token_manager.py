@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from Data_extraction.Deputy.deputy_client import get_client
+from Data_extraction.json_files import write_json_atomic
+
+# Load environment variables from .env file
+load_dotenv()
+TOKEN_STORE_PATH = "Data/Deputy/tokens.json"  # Refreshed tokens live here, not in .env
+REFRESH_MARGIN = 5 * 60  # Refresh this many seconds before the access token expires
+
+
+class TokenManager:
+    """
+    Keeps the Deputy OAuth access token in memory and refreshes it only when needed.
+
+    The token is cached together with its expiry time, so commands reuse it
+    instead of refreshing on every call. Concurrent callers wait on the same
+    refresh, so the refresh token is only ever used once. New tokens are
+    written atomically to their own JSON store.
+
+    Args:
+        client_id (str): Deputy API key.
+        client_secret (str): Deputy API secret.
+        store_path (str): Path to the JSON token store.
+        refresh_margin (int): Seconds before expiry at which the token is refreshed.
+    """
+
+    def __init__(self, client_id, client_secret, store_path=TOKEN_STORE_PATH, refresh_margin=REFRESH_MARGIN):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.store_path = store_path
+        self.refresh_margin = refresh_margin
+        self.access_token = None
+        self.refresh_token = None
+        self.expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._load()
+
+    def _load(self):
+        """Reads the token store, falling back to the tokens in .env on first run."""
+        try:
+            with open(self.store_path, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            self.access_token = data.get("access_token")
+            self.refresh_token = data.get("refresh_token")
+            self.expires_at = float(data.get("expires_at", 0))
+            logging.info(f"Loaded Deputy tokens from {self.store_path}.")
+        except FileNotFoundError:
+            # Expiry is unknown for the .env tokens, so the first call refreshes once
+            self.access_token = os.getenv("ACCESS_TOKEN")
+            self.refresh_token = os.getenv("REFRESH_TOKEN")
+            self.expires_at = 0.0
+        except (ValueError, OSError) as e:
+            logging.error(f"Error reading token store {self.store_path}: {e}")
+
+    def _save(self, data):
+        """Writes the token store atomically (temp file + rename)."""
+        write_json_atomic(self.store_path, data)
+
+    def is_valid(self):
+        return bool(self.access_token) and time.time() < self.expires_at - self.refresh_margin
+
+    async def get_token(self):
+        """Returns a valid access token, refreshing it first if it is about to expire."""
+        if self.is_valid():
+            return self.access_token
+
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if self.is_valid():
+                return self.access_token
+            await self._refresh()
+            return self.access_token
+
+    def invalidate(self):
+        """Forces a refresh on the next call, e.g. after Deputy answered 401."""
+        self.expires_at = 0.0
+
+    async def _refresh(self):
+        payload = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "redirect_uri": "http://localhost",
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token,
+            "scope": "longlife_refresh_token"
+        }
+        data = await get_client().post_form("/oauth/access_token", payload)
+
+        self.access_token = data.get("access_token")
+        self.refresh_token = data.get("refresh_token") or self.refresh_token
+        self.expires_at = time.time() + int(data.get("expires_in", 0))
+
+        await asyncio.to_thread(self._save, {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.expires_at
+        })
+        logging.info(f"Deputy access token refreshed, valid for {data.get('expires_in')} seconds.")
+
+
+_token_manager = None
+
+
+def get_token_manager():
+    """Returns the process-wide Deputy token manager."""
+    global _token_manager
+    if _token_manager is None:
+        _token_manager = TokenManager(os.getenv("DEPUTY_API_KEY"), os.getenv("DEPUTY_API_SECRET"))
+    return _token_manager
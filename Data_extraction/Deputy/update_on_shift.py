@@ -0,0 +1,334 @@
+import time
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from Data_extraction.Deputy.deputy_client import get_client, DeputyAPIError
+from Data_extraction.Deputy.token_manager import get_token_manager
+from Data_extraction.Deputy.shifts import shift_keys
+from Data_extraction.datastore import get_store
+
+#https://once.deputy.com/my/oauth/login?client_id=7e1fb2caa48adcef84c3dafe17ff801df8ab5ced&redirect_uri=http://localhost&response_type=code&scope=longlife_refresh_token
+
+# Every department we build a roster for. "operational_units" is the
+# LabelWithCompany allow-list, or None for every unit in the company.
+# "csv_file" is where `python -m Data_extraction.datastore export` writes the roster.
+DEPARTMENTS = {
+    "ops": {
+        "company": "Bergen",
+        "operational_units": ["[BRG] Operations", "[BRG] Night Shift", "[BRG] Operations Training/follow up", "[BRG] Management"],
+        "csv_file": "Data/Deputy/Bergen_ops.csv"
+    },
+    "mech": {
+        "company": "Bergen",
+        "operational_units": ["[BRG] Mechanics", "[BRG] Shiftleader", "[BRG] Mechanics Training/follow up", "[BRG] Management"],
+        "csv_file": "Data/Deputy/Bergen_mech.csv"
+    },
+    "stavanger": {
+        "company": "Stavanger",
+        "operational_units": None,
+        "csv_file": "Data/Deputy/Stavanger_on_shift.csv"
+    }
+}
+
+RESOURCES = ["Timesheet", "Roster"]
+FULL_RESYNC_INTERVAL = 60 * 60  # Seconds between full resyncs that correct any drift from delta syncs
+WINDOW_DAYS_BEFORE = 1  # The rolling window runs from yesterday (night shifts crossing midnight) ...
+WINDOW_DAYS_AFTER = 7  # ... to a week ahead, for planning tomorrow and later
+
+# The only parts of a Timesheet/Roster item we keep, everything else is dropped while parsing
+ShiftRecord = namedtuple("ShiftRecord", ["id", "modified", "start_time", "end_time", "employees"])
+
+
+def window_days(today=None):
+    """Returns the first and last date of the synced window, see WINDOW_DAYS_BEFORE/AFTER."""
+    today = today or datetime.now().date()
+    return today - timedelta(days=WINDOW_DAYS_BEFORE), today + timedelta(days=WINDOW_DAYS_AFTER)
+
+
+def build_department_lookup(departments):
+    """
+    Maps (company, LabelWithCompany) to the departments that include it,
+    so every item is routed with one dictionary lookup. Departments that
+    take a whole company are listed under (company, None).
+    """
+    lookup = {}
+    for name, department in departments.items():
+        labels = department["operational_units"] or [None]
+        for label in labels:
+            lookup.setdefault((department["company"], label), []).append(name)
+    return lookup
+
+
+def extract_employees(item):
+    """
+    Returns the (employee ID, display name, company, unit label) tuples in a
+    Timesheet/Roster item.
+    """
+    dp_metadata = item.get("_DPMetaData", {})  # Get metadata or empty dict
+    if not dp_metadata:
+        logging.warning(f"'_DPMetaData' is missing in {item.get('Id')}, skipping it.")
+        return []
+
+    operational_unit_info = dp_metadata.get("OperationalUnitInfo", {})  # Get unit info or empty dict
+    if operational_unit_info is None:
+        logging.warning(f"'OperationalUnitInfo' is missing in {item.get('Id')} (employee {item.get('Employee')}), skipping it.")
+        return []
+
+    company_name = operational_unit_info.get("CompanyName")
+    label_with_company = operational_unit_info.get("LabelWithCompany")
+
+    employee_info = dp_metadata.get("EmployeeInfo", {})
+    # Handle if EmployeeInfo is a list
+    if isinstance(employee_info, list):
+        infos = [info for info in employee_info if isinstance(info, dict)]
+    # Handle if EmployeeInfo is a dict
+    elif isinstance(employee_info, dict):
+        infos = [employee_info]
+    else:
+        logging.warning(f"Unexpected EmployeeInfo format in {item.get('Id')}: {type(employee_info).__name__}")
+        return []
+
+    return [
+        (info.get("Id") or item.get("Employee") or info.get("DisplayName"), info.get("DisplayName"), company_name, label_with_company)
+        for info in infos
+        if info.get("DisplayName")
+    ]
+
+
+def slim_record(item):
+    """Reduces a parsed Timesheet/Roster item to a ShiftRecord."""
+    return ShiftRecord(item.get("Id"), item.get("Modified"), item.get("StartTime"), item.get("EndTime"), extract_employees(item))
+
+
+async def fetch_resource(client, resource, payload, access_token):
+    """
+    Streams one Deputy QUERY page by page and reports how long it took.
+
+    Items are reduced to ShiftRecords as they are parsed, so the full
+    response is never held in memory. Returns (resource, records), or
+    (resource, None) if the request failed so the caller can carry on with
+    the other resources.
+    """
+    started = time.perf_counter()
+    records = []
+    try:
+        async for record in client.iter_query(resource, payload, access_token, transform=slim_record):
+            records.append(record)
+        logging.info(f"{resource} answered with {len(records)} items in {time.perf_counter() - started:.2f}s.")
+        return resource, records
+    except DeputyAPIError as e:
+        logging.error(f"Error accessing {resource} after {time.perf_counter() - started:.2f}s: {e}")
+        if e.status == 401:
+            get_token_manager().invalidate()  # Token was revoked, refresh on the next sync
+        return resource, None
+
+
+async def resolve_unit_filter(client, departments, access_token):
+    """
+    Returns the operational unit IDs of all departments combined, or None if
+    any of them could not be resolved (then Deputy is queried unfiltered and
+    the departments are split locally only).
+    """
+    unit_ids = set()
+    try:
+        for department in departments.values():
+            ids = await client.resolve_operational_units(department["company"], department["operational_units"], access_token)
+            if not ids:
+                return None
+            unit_ids.update(ids)
+    except DeputyAPIError as e:
+        logging.warning(f"Error resolving operational units, filtering locally instead: {e}")
+        return None
+    return sorted(unit_ids)
+
+
+class DepartmentSync:
+    """
+    Keeps a rolling window of Timesheet and Roster records (yesterday through
+    a week ahead) in memory and syncs them from Deputy incrementally.
+
+    After a full sync, only records with a Modified time newer than the
+    latest one seen (the high-water mark, per resource) are fetched and
+    merged in by record ID. A full resync runs every full_resync_interval,
+    and when the day changes, to pick up deleted or moved records that a
+    delta query cannot see.
+
+    The records are indexed by (date, shift), so people_on() answers for any
+    shift in the window without calling Deputy.
+
+    Args:
+        departments (dict): Department definitions, see DEPARTMENTS.
+        full_resync_interval (int): Seconds between full resyncs.
+    """
+
+    def __init__(self, departments=DEPARTMENTS, full_resync_interval=FULL_RESYNC_INTERVAL):
+        self.departments = departments
+        self.full_resync_interval = full_resync_interval
+        self.lookup = build_department_lookup(departments)
+        self.records = {resource: {} for resource in RESOURCES}  # Resource -> record ID -> ShiftRecord
+        self.high_water = {}  # Resource -> latest Modified value seen
+        self.last_full_sync = 0.0
+        self.synced_at = None  # Unix time of the last sync where every endpoint answered
+        self.window_start = None
+        self.index = {}  # (date, shift) -> department -> employee ID -> display name
+        self.written = {}
+        self._running = None  # The sync in progress, shared by concurrent callers
+
+    def needs_full_sync(self, window_start):
+        return (
+            self.window_start != window_start
+            or time.time() - self.last_full_sync > self.full_resync_interval
+            or any(resource not in self.high_water for resource in RESOURCES)
+        )
+
+    async def sync(self, access_token):
+        """
+        Syncs every department's roster from Deputy and stores today's rosters.
+
+        Only one sync runs at a time: callers that come in while a sync is
+        running (e.g. the roster refreshes of several guilds) wait for it and
+        share its result, instead of changing the records concurrently.
+
+        Returns:
+            A dict of department name -> number of people for every department that had people on shift.
+        """
+        if self._running is None or self._running.done():
+            self._running = asyncio.create_task(self._sync(access_token))
+        return await asyncio.shield(self._running)
+
+    async def _sync(self, access_token):
+        # Calculate the window's start and end times as Unix timestamps
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        window_start = int((midnight - timedelta(days=WINDOW_DAYS_BEFORE)).timestamp())
+        window_end = int((midnight + timedelta(days=WINDOW_DAYS_AFTER + 1)).timestamp()) - 1
+        full_sync = self.needs_full_sync(window_start)
+        sync_started = datetime.now().astimezone().isoformat(timespec="seconds")
+
+        # JSON payload to retrieve timesheets with StartTime within the window
+        payload = {
+            "search": {
+                "s1": {
+                    "field": "StartTime",
+                    "data": window_start,
+                    "type": "ge"
+                },
+                "s2": {
+                    "field": "StartTime",
+                    "data": window_end,
+                    "type": "le"
+                }
+            }
+        }
+
+        # Let Deputy filter on operational unit, so only our departments are transferred
+        client = get_client()
+        unit_ids = await resolve_unit_filter(client, self.departments, access_token)
+        if unit_ids:
+            payload["search"]["s3"] = {
+                "field": "OperationalUnit",
+                "data": unit_ids,
+                "type": "in"
+            }
+
+        def resource_payload(resource):
+            if full_sync:
+                return payload
+            # Only records changed since the last sync
+            search = {**payload["search"], "s4": {"field": "Modified", "data": self.high_water[resource], "type": "gt"}}
+            return {**payload, "search": search}
+
+        # Query Timesheet and Roster at the same time, so their latencies overlap
+        results = await asyncio.gather(
+            *(fetch_resource(client, resource, resource_payload(resource), access_token) for resource in RESOURCES)
+        )
+
+        changed = False
+        complete = True
+        for resource, records in results:
+            if records is None:
+                # The endpoint failed, keep what we have and try a full sync next time
+                self.high_water.pop(resource, None)
+                complete = False
+                continue
+            if full_sync:
+                self.records[resource] = {}
+            latest = ""
+            for record in records:
+                self.records[resource][record.id] = record
+                if record.modified and record.modified > latest:
+                    latest = record.modified
+            if full_sync:
+                # With no records to take a Modified value from, look for changes since now
+                self.high_water[resource] = latest or sync_started
+            elif latest > self.high_water[resource]:
+                self.high_water[resource] = latest
+            changed = changed or full_sync or bool(records)
+
+        if full_sync and complete:
+            self.last_full_sync = time.time()
+            self.window_start = window_start
+        if complete:
+            self.synced_at = time.time()
+        logging.info(f"{'Full' if full_sync else 'Delta'} sync done, {sum(len(r) for r in self.records.values())} records held.")
+
+        if changed:
+            self.written = await self.write_rosters()
+        return self.written
+
+    def people_on(self, department, day, shift):
+        """Returns the (employee ID, display name) pairs in a department on a given (date, shift), from memory."""
+        return list(self.index.get((day, shift), {}).get(department, {}).items())
+
+    async def write_rosters(self):
+        """
+        Splits the held records into every department's roster and the
+        (date, shift) index in one pass, and stores today's rosters.
+
+        The split runs in a worker thread on a snapshot of the records, so a
+        large window does not block the event loop.
+        """
+        today = datetime.now().date()
+        records = [record for resource in RESOURCES for record in self.records[resource].values()]
+        self.index, rosters = await asyncio.to_thread(self._split, records, today)
+
+        # Store every department's roster in one transaction
+        await get_store().replace_rosters(today, rosters)
+        written = {}
+        for name, display_names in rosters.items():
+            if not display_names:
+                logging.info(f"No timesheets found for department '{name}'.")
+                continue
+            logging.info(f"{len(display_names)} people in '{name}' stored for {today}.")
+            written[name] = len(display_names)
+        return written
+
+    def _split(self, records, today):
+        """Returns the (date, shift) index and today's roster per department for the records."""
+        index = {}
+        rosters = {name: {} for name in self.departments}  # Department -> employee ID -> display name, today only
+        for record in records:
+            starts_today = bool(record.start_time) and datetime.fromtimestamp(record.start_time).date() == today
+            keys = shift_keys(record.start_time, record.end_time)
+            for employee_id, display_name, company_name, label_with_company in record.employees:
+                targets = self.lookup.get((company_name, label_with_company), []) + self.lookup.get((company_name, None), [])
+                for name in targets:
+                    for key in keys:
+                        index.setdefault(key, {}).setdefault(name, {}).setdefault(employee_id, display_name)
+                    if starts_today and employee_id not in rosters[name]:  # Avoid duplicates
+                        rosters[name][employee_id] = display_name
+        return index, rosters
+
+
+department_sync = DepartmentSync()
+
+
+async def update_on_shift(sync=None):
+    """Syncs every department from Deputy, reusing the cached access token while it is valid."""
+    try:
+        access_token = await get_token_manager().get_token()
+    except DeputyAPIError as e:
+        logging.error(f"Error renewing access token: {e}")
+        return {}
+
+    return await (sync or department_sync).sync(access_token)
@@ -0,0 +1,100 @@
+import asyncio
+import csv
+import logging
+import os
+
+from Data_extraction.models import Catalog
+
+
+def option_row(index, row):
+    """Parses a dropdown option row: label, value (generated if missing) and username."""
+    return {
+        'label': (row.get('label') or '').strip(),
+        'value': (row.get('value') or '').strip() or f"generated_value_{index}",  # Generate unique value if missing
+        'username': (row.get('username') or '').strip()
+    }
+
+
+class CsvCache:
+    """
+    Shared cache of parsed CSV files, for the plan commands and the Deputy matching.
+
+    Rows are cached per (path, row parser) and reused until the file's
+    modification time or size changes, so files like Bergen_areas.csv are
+    parsed once instead of on every plan. Parsing runs in a worker thread.
+    The cached rows are shared between callers and must not be modified.
+    """
+
+    def __init__(self):
+        self._entries = {}  # (path, parser) -> (mtime_ns, size, rows)
+        self._catalogs = {}  # (path, item type) -> (rows, Catalog)
+        self.hits = 0
+        self.misses = 0
+
+    async def read(self, path, parse=None):
+        """
+        Returns the rows of a CSV file as dicts, or an empty list if it cannot be read.
+
+        Args:
+            path (str): Path to the CSV file.
+            parse: Optional function (index, row) -> parsed row, e.g. option_row.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logging.error(f"Error reading CSV {path}: {e}")
+            return []
+
+        key = (path, parse)
+        entry = self._entries.get(key)
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        try:
+            rows = await asyncio.to_thread(self._parse, path, parse)
+        except Exception as e:
+            logging.error(f"Error reading CSV {path}: {e}")
+            return []
+        self._entries[key] = (stat.st_mtime_ns, stat.st_size, rows)
+        logging.info(f"Read {len(rows)} rows from {path}.")
+        return rows
+
+    async def catalog(self, path, item_type):
+        """
+        Returns a catalog CSV (areas or tasks) as an indexed Catalog.
+
+        The Catalog is built once per version of the file, together with
+        its rows, and shared by every caller.
+
+        Args:
+            path (str): Path to the CSV file.
+            item_type: The catalog's item class, e.g. Area or Task.
+        """
+        rows = await self.read(path, item_type.from_row)
+        key = (path, item_type)
+        entry = self._catalogs.get(key)
+        if entry is None or entry[0] is not rows:
+            entry = self._catalogs[key] = (rows, Catalog(rows))
+        return entry[1]
+
+    @staticmethod
+    def _parse(path, parse):
+        with open(path, mode='r', encoding='utf-8') as file:
+            rows = csv.DictReader(file)
+            if parse is None:
+                return list(rows)
+            return [parse(index, row) for index, row in enumerate(rows)]
+
+    def invalidate(self, path=None):
+        """Drops the cached rows for a file, or for every file."""
+        for entries in (self._entries, self._catalogs):
+            for key in [key for key in entries if path is None or key[0] == path]:
+                del entries[key]
+
+    def stats(self):
+        return {'files': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+csv_cache = CsvCache()
@@ -0,0 +1,363 @@
+"""
+Embedded SQLite store for the bot's runtime state: Deputy rosters,
+Deputy -> Discord identities, shift plans with their assignments, and
+pending reminders.
+
+The database runs in WAL mode, so readers (e.g. the export below) never
+block the bot's writes, and every change is one transaction. All queries
+run on a single worker thread, off the Discord event loop.
+
+The CSV files under Data/ are only an import/export format now:
+    python -m Data_extraction.datastore export   # Writes the CSVs from the database
+    python -m Data_extraction.datastore import   # Loads today's Deputy roster CSVs into the database
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "Data/ryde.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rosters (
+    department TEXT NOT NULL,
+    day TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    label TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (department, day, employee_id)
+);
+CREATE TABLE IF NOT EXISTS identities (
+    employee_id TEXT PRIMARY KEY,
+    discord_id INTEGER NOT NULL,
+    name TEXT,
+    source TEXT,
+    updated_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS identities_discord_id ON identities (discord_id);
+CREATE TABLE IF NOT EXISTS identity_names (
+    name TEXT PRIMARY KEY,
+    discord_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS identity_names_discord_id ON identity_names (discord_id);
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    leader_id INTEGER NOT NULL,
+    leader_name TEXT,
+    created_at INTEGER NOT NULL,
+    message_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS plans_channel ON plans (guild_id, channel_id, kind, created_at);
+CREATE TABLE IF NOT EXISTS assignments (
+    plan_id INTEGER NOT NULL REFERENCES plans (id) ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    member_id INTEGER,
+    areas TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (plan_id, label)
+);
+CREATE TABLE IF NOT EXISTS reminders (
+    id TEXT PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    due REAL NOT NULL,
+    message TEXT NOT NULL,
+    mentions TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS reminders_due ON reminders (due);
+"""
+
+
+class DataStore:
+    """
+    Async wrapper around one SQLite connection.
+
+    Every call is run on the store's single worker thread, so the event
+    loop never waits on disk and writes are applied in the order they were
+    made. Fire-and-forget writes from synchronous code go through submit().
+
+    Args:
+        path (str): Path to the SQLite database file.
+    """
+
+    def __init__(self, path=DATABASE_PATH):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="datastore")
+        self._connection = None
+
+    def _connect(self):
+        """Opens the connection on the worker thread the first time it is needed."""
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, and no fsync per commit
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _transaction(self, work):
+        connection = self._connect()
+        with connection:  # Commits, or rolls back if work raises
+            return work(connection)
+
+    async def run(self, work):
+        """Runs work(connection) in one transaction on the worker thread and returns its result."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._transaction, work)
+
+    def submit(self, work):
+        """Queues work(connection) without waiting for it; errors are logged."""
+        future = self._executor.submit(self._transaction, work)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception():
+            logging.error(f"Data store write failed: {future.exception()}")
+
+    async def execute(self, sql, params=()):
+        return await self.run(lambda connection: connection.execute(sql, params).rowcount)
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda connection: [dict(row) for row in connection.execute(sql, params)])
+
+    async def fetchone(self, sql, params=()):
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        def close_connection():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self._executor.submit(close_connection).result()
+        self._executor.shutdown()
+
+    # Rosters
+
+    async def replace_rosters(self, day, rosters):
+        """
+        Replaces the Deputy rosters for a day.
+
+        Args:
+            day (date): The day.
+            rosters (dict): Department -> {employee ID: display name}.
+        """
+        now = int(time.time())
+
+        def work(connection):
+            for department, people in rosters.items():
+                connection.execute("DELETE FROM rosters WHERE department = ? AND day = ?", (department, day.isoformat()))
+                connection.executemany(
+                    "INSERT INTO rosters (department, day, employee_id, label, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(department, day.isoformat(), str(employee_id), label, now) for employee_id, label in people.items()]
+                )
+        await self.run(work)
+
+    async def roster(self, department, day):
+        """Returns the (employee ID, display name) pairs on a department's roster for a day."""
+        rows = await self.fetchall(
+            "SELECT employee_id, label FROM rosters WHERE department = ? AND day = ? ORDER BY label",
+            (department, day.isoformat())
+        )
+        return [(row["employee_id"], row["label"]) for row in rows]
+
+    # Identities. The writes are queued (see submit), for the synchronous matching code.
+
+    async def identities(self):
+        """Returns ({employee ID: identity dict}, {normalized name: Discord ID})."""
+        def work(connection):
+            identities = {
+                row["employee_id"]: {key: row[key] for key in ("discord_id", "name", "source", "updated_at")}
+                for row in connection.execute("SELECT * FROM identities")
+            }
+            names = {row["name"]: row["discord_id"] for row in connection.execute("SELECT * FROM identity_names")}
+            return identities, names
+        return await self.run(work)
+
+    def write_identities(self, identities=None, names=None):
+        """Queues an upsert of {employee ID: identity dict} and {normalized name: Discord ID}."""
+        def work(connection):
+            connection.executemany(
+                "INSERT OR REPLACE INTO identities (employee_id, discord_id, name, source, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, entry["discord_id"], entry["name"], entry["source"], entry["updated_at"]) for key, entry in (identities or {}).items()]
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO identity_names (name, discord_id) VALUES (?, ?)", list((names or {}).items())
+            )
+        return self.submit(work)
+
+    def delete_identities(self, employee_ids=(), names=()):
+        """Queues the removal of identities by employee ID and name-keyed entries by name."""
+        def work(connection):
+            connection.executemany("DELETE FROM identities WHERE employee_id = ?", [(key,) for key in employee_ids])
+            connection.executemany("DELETE FROM identity_names WHERE name = ?", [(name,) for name in names])
+        return self.submit(work)
+
+    # Reminders. The writes are queued (see submit).
+
+    async def reminders(self):
+        rows = await self.fetchall("SELECT * FROM reminders ORDER BY due")
+        return [{**row, "mentions": json.loads(row["mentions"])} for row in rows]
+
+    def add_reminder(self, reminder):
+        return self.submit(lambda connection: connection.execute(
+            "INSERT OR REPLACE INTO reminders (id, channel_id, due, message, mentions) VALUES (?, ?, ?, ?, ?)",
+            (reminder["id"], reminder["channel_id"], reminder["due"], reminder["message"],
+             json.dumps(reminder["mentions"], ensure_ascii=False))
+        ))
+
+    def delete_reminders(self, reminder_ids):
+        return self.submit(lambda connection: connection.executemany(
+            "DELETE FROM reminders WHERE id = ?", [(reminder_id,) for reminder_id in reminder_ids]
+        ))
+
+    # Plans and assignments
+
+    async def create_plan(self, guild_id, channel_id, kind, leader_id, leader_name, people):
+        """
+        Stores a new plan with the selected people and returns its ID.
+
+        Args:
+            people (list): The Person objects selected in the plan.
+        """
+        def work(connection):
+            plan_id = connection.execute(
+                "INSERT INTO plans (guild_id, channel_id, kind, leader_id, leader_name, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (guild_id, channel_id, kind, leader_id, leader_name, int(time.time()))
+            ).lastrowid
+            connection.executemany(
+                "INSERT OR REPLACE INTO assignments (plan_id, label, member_id) VALUES (?, ?, ?)",
+                [(plan_id, person.name, person.discord_id) for person in people]
+            )
+            return plan_id
+        return await self.run(work)
+
+    async def set_areas(self, plan_id, label, areas):
+        await self.execute(
+            "UPDATE assignments SET areas = ? WHERE plan_id = ? AND label = ?",
+            (json.dumps(areas, ensure_ascii=False), plan_id, label)
+        )
+
+    async def finish_plan(self, plan_id, message_id):
+        await self.execute("UPDATE plans SET message_id = ? WHERE id = ?", (message_id, plan_id))
+
+    async def get_plan(self, plan_id):
+        return await self.fetchone("SELECT * FROM plans WHERE id = ?", (plan_id,))
+
+    async def assignments(self, plan_id):
+        """Returns the plan's assignments as {'label', 'member_id', 'areas'} dicts."""
+        rows = await self.fetchall("SELECT label, member_id, areas FROM assignments WHERE plan_id = ? ORDER BY rowid", (plan_id,))
+        return [{**row, "areas": json.loads(row["areas"])} for row in rows]
+
+    async def pinned_plan_messages(self, guild_id, channel_id, exclude_kind=None):
+        """Returns the message IDs of the latest posted plan of each kind in a channel, except exclude_kind."""
+        rows = await self.fetchall(
+            """
+            SELECT message_id FROM plans
+            WHERE id IN (
+                SELECT MAX(id) FROM plans
+                WHERE guild_id = ? AND channel_id = ? AND message_id IS NOT NULL
+                GROUP BY kind
+            ) AND kind IS NOT ?
+            """,
+            (guild_id, channel_id, exclude_kind)
+        )
+        return {row["message_id"] for row in rows}
+
+    async def latest_plan(self, kind):
+        return await self.fetchone("SELECT * FROM plans WHERE kind = ? ORDER BY created_at DESC, id DESC LIMIT 1", (kind,))
+
+
+_store = None
+
+
+def get_store():
+    """Returns the shared data store, opening it on first use."""
+    global _store
+    if _store is None:
+        _store = DataStore()
+    return _store
+
+
+def close_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
+# CSV import/export
+
+def roster_files():
+    from Data_extraction.Deputy.update_on_shift import DEPARTMENTS
+    return {name: department["csv_file"] for name, department in DEPARTMENTS.items()}
+
+
+async def export_csv(store, day):
+    """Writes today's Deputy rosters and the latest ops plan to the CSV files the bot used to keep."""
+    for department, csv_file in roster_files().items():
+        people = await store.roster(department, day)
+        with open(csv_file, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["label", "employee_id"])
+            writer.writerows((label, employee_id) for employee_id, label in people)
+        print(f"{len(people)} people in '{department}' written to {csv_file}")
+
+    plan = await store.latest_plan("ops")
+    if plan:
+        with open("Data/Current_shift.csv", mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["label", "Username"])
+            for assignment in await store.assignments(plan["id"]):
+                member_id = assignment["member_id"]
+                writer.writerow([assignment["label"], f"@{member_id}" if member_id else "Not matched"])
+        with open("Data/skiftleder.csv", mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Skiftleder"])
+            writer.writerow([plan["leader_name"]])
+        print(f"Plan {plan['id']} written to Data/Current_shift.csv and Data/skiftleder.csv")
+
+
+async def import_csv(store, day):
+    """Loads the Deputy roster CSVs (label, employee_id) into the database as the given day's rosters."""
+    rosters = {}
+    for department, csv_file in roster_files().items():
+        try:
+            with open(csv_file, mode="r", encoding="utf-8") as file:
+                rosters[department] = {
+                    row.get("employee_id") or f"csv:{row['label']}": row["label"] for row in csv.DictReader(file)
+                }
+            print(f"{len(rosters[department])} people in '{department}' read from {csv_file}")
+        except FileNotFoundError:
+            continue
+    await store.replace_rosters(day, rosters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export the bot's CSV files.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("--day", type=date.fromisoformat, default=date.today(), help="Roster day, YYYY-MM-DD")
+    args = parser.parse_args()
+
+    async def run():
+        store = get_store()
+        try:
+            await (import_csv if args.action == "import" else export_csv)(store, args.day)
+        finally:
+            close_store()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import json
+import os
+import tempfile
+
+
+def write_json_atomic(path, data, **dump_options):
+    """
+    Writes data as JSON to path atomically (temp file + rename), so a crash
+    mid-write never leaves a half-written file behind.
+
+    Args:
+        path (str): Path to the JSON file. Its directory is created if needed.
+        data: The data to write.
+        **dump_options: Passed on to json.dump, e.g. ensure_ascii=False.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}-", suffix=".json")
+    try:
+        with os.fdopen(fd, mode="w", encoding="utf-8") as file:
+            json.dump(data, file, **dump_options)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,140 @@
+import discord
+
+
+def discord_id_of(username):
+    """Returns the user ID in a roster 'username' ("@<user ID>"), or None if unmatched."""
+    username = (username or "").strip().lstrip("@")
+    return int(username) if username.isdigit() else None
+
+
+class Person:
+    """
+    Someone on a roster, as offered in the plan commands' people dropdown.
+
+    People come from the roster cache or the roster CSVs and are shared
+    between plans; selecting someone keeps a reference, never a copy.
+
+    Args:
+        name (str): Name from Deputy, also the dropdown label.
+        value (str): Unique dropdown value, the Discord ID if matched.
+        discord_id (int): Discord user ID, or None if not matched.
+        deputy_id: Deputy employee ID, or None if not known.
+    """
+
+    __slots__ = ("name", "value", "discord_id", "deputy_id")
+
+    def __init__(self, name, value, discord_id=None, deputy_id=None):
+        self.name = name
+        self.value = value
+        self.discord_id = discord_id
+        self.deputy_id = deputy_id
+
+    @classmethod
+    def from_row(cls, index, row):
+        """Parses a roster CSV row (label, value, username), for CsvCache.read."""
+        name = (row.get('label') or '').strip()
+        discord_id = discord_id_of(row.get('username'))
+        value = (row.get('value') or '').strip() or f"generated_value_{index}"  # Generate unique value if missing
+        return cls(name, value, discord_id)
+
+    @property
+    def mention(self):
+        """'<@id>' if matched, otherwise the name."""
+        return f"<@{self.discord_id}>" if self.discord_id else self.name
+
+    def __repr__(self):
+        return f"Person({self.name!r}, discord_id={self.discord_id})"
+
+
+class Area:
+    """
+    An area (ops) or task (mech) from a catalog CSV. Catalogs are parsed
+    once by the CSV cache and shared by every plan.
+
+    Args:
+        label (str): Shown in the dropdown and the plan.
+        value (str): Unique dropdown value within the catalog.
+    """
+
+    __slots__ = ("label", "value")
+
+    def __init__(self, label, value):
+        self.label = label
+        self.value = value
+
+    @classmethod
+    def from_row(cls, index, row):
+        """Parses a catalog CSV row (label, value), for CsvCache.read."""
+        label = (row.get('label') or '').strip()
+        value = (row.get('value') or '').strip() or f"generated_value_{index}"  # Generate unique value if missing
+        return cls(label, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.label!r})"
+
+
+class Task(Area):
+    """A mech task from tasks_mech.csv."""
+
+    __slots__ = ()
+
+
+class Assignment:
+    """
+    Where one person in a plan goes: a reference to the Person and the
+    labels of their areas or tasks.
+    """
+
+    __slots__ = ("person", "areas")
+
+    def __init__(self, person, areas):
+        self.person = person
+        self.areas = areas
+
+    def __repr__(self):
+        return f"Assignment({self.person.name!r}, {self.areas!r})"
+
+
+class Catalog:
+    """
+    The areas or tasks of one catalog CSV, indexed once when the catalog is
+    loaded (see CsvCache.catalog) and shared by every plan until the file changes.
+
+    Every person's dropdown offers the same options with the items' own
+    values; which person a dropdown is for is carried by its custom_id. The
+    SelectOption objects are built once per catalog and shared between
+    dropdowns, and a selected value is decoded with one dictionary lookup.
+
+    Args:
+        items (list): The catalog's Area or Task objects, in file order.
+    """
+
+    __slots__ = ("items", "by_value", "_select_options")
+
+    def __init__(self, items):
+        self.items = items
+        self.by_value = {item.value: item for item in items}
+        self._select_options = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def select_options(self):
+        """
+        Returns the catalog's dropdown options, a new list of the shared
+        SelectOption objects. Callers must not modify the options themselves.
+        """
+        if self._select_options is None:
+            self._select_options = tuple(
+                discord.SelectOption(label=item.label, value=item.value) for item in self.items
+            )
+        return list(self._select_options)
+
+    def decode(self, value):
+        """Returns the item for a dropdown value, or None if it is not in the catalog."""
+        return self.by_value.get(value)
+
+    def label(self, value):
+        """The label for a dropdown value, or the value itself if it is not in the catalog."""
+        item = self.decode(value)
+        return item.label if item else value
@@ -1,15 +1,23 @@
+import asyncio
 import discord
 import csv
-from discord.ext import commands
+from discord.ext import commands, tasks
 import os
 from dotenv import load_dotenv
 import logging
 from Commands.opsplan import opsplan
 from Commands.mechplan2 import mechplan
 from Commands.edit import save_message, edit_last_message  # Import from edit.py
-from Data_extraction.Deputy.match_names_from_deputy import match_and_update
-from Data_extraction.Deputy.update_ops_on_shift import update_ops
-from Data_extraction.Deputy.update_mech_on_shift import update_mech
+from Commands.reminders import reminder_scheduler
+from Data_extraction.Deputy.roster_cache import roster_cache
+from Data_extraction.Deputy.shifts import parse_shift_args
+from Data_extraction.Deputy.update_on_shift import window_days
+from Data_extraction.Deputy.member_index import member_index, normalize_name
+from Data_extraction.Deputy.member_snapshot import member_snapshot
+from Data_extraction.Deputy.match_names_from_deputy import match_reports
+from Data_extraction.Deputy.identity_store import identity_store
+from Data_extraction.Deputy.deputy_client import close_client
+from Data_extraction.datastore import close_store
 
 
 # Load environment variables
@@ -25,59 +33,171 @@ intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-# Initialize the bot
-bot = commands.Bot(command_prefix="!", intents=intents)
+class RydeBot(commands.Bot):
 
+    async def close(self):
+        """Logs out, then closes the Deputy connection pool and the database (after its queued writes)."""
+        await super().close()
+        await close_client()
+        await asyncio.to_thread(close_store)
 
-async def prepare_data(ctx, deputy_file, output_file):
+
+# Initialize the bot. Members are chunked in the background after login
+# (see on_ready), so the bot is usable before every guild is chunked.
+bot = RydeBot(command_prefix="!", intents=intents, chunk_guilds_at_startup=False)
+
+
+def shift_to_plan(args):
+    """
+    Parses the shift a plan command is for, see parse_shift_args.
+
+    Raises:
+        ValueError: With a message for the user, if the date cannot be read
+            or is outside the days synced from Deputy.
+    """
+    plan_for = parse_shift_args(args)
+    if plan_for:
+        first, last = window_days()
+        if not first <= plan_for[0] <= last:
+            raise ValueError(f"Can only plan shifts from {first:%d.%m} to {last:%d.%m}.")
+    return plan_for
+
+
+async def prepare_data(ctx, kind, plan_for=None):
     """
     Prepare data before executing commands.
+
+    Returns the cached roster (people, updated_at) for "ops" or "mech",
+    for today or for a given (date, shift). Only waits for Deputy if
+    nothing has been cached yet.
     """
     try:
         logging.info("Preparing data...")
-        await match_and_update(ctx, deputy_file, output_file)
-        logging.info(
-            f"Name matching completed successfully and written to {output_file}."
-        )
+        if plan_for:
+            people, updated_at = await roster_cache.get_shift(ctx.guild, kind, *plan_for)
+        else:
+            people, updated_at = await roster_cache.get(ctx.guild, kind)
+        logging.info(f"Using {kind} roster with {len(people)} people.")
+        return people, updated_at
     except Exception as e:
         logging.error(f"Error during data preparation: {e}")
         await ctx.send(
             f"An error occurred during data preparation. Please try again.\n{e}"
         )
+        return None, None
+
+
+@tasks.loop(minutes=1)
+async def prefetch_rosters():
+    """
+    Keeps the rosters warm, refreshing them when they are older than the
+    refresh interval or a new shift has started.
+    """
+    for guild in bot.guilds:
+        if roster_cache.is_any_stale(guild):
+            try:
+                await roster_cache.refresh(guild)
+            except Exception as e:
+                logging.error(f"Error prefetching rosters for {guild.name}: {e}")
+
+
+def on_guild_chunked(guild):
+    """
+    Rebuilds the member index from the full member cache, and re-matches
+    the rosters that were matched against the partial index before.
+    """
+    member_index.build(guild)
+    roster_cache.refresh_in_background(guild)
+
+
+@bot.event
+async def on_ready():
+    logging.info(f"Logged in as {bot.user}.")
+    await identity_store.load()
+    for guild in bot.guilds:
+        member_index.build(guild)  # From the member snapshot until the guild is chunked
+        member_snapshot.chunk_in_background(guild, on_chunked=on_guild_chunked)
+    if not prefetch_rosters.is_running():
+        prefetch_rosters.start()
+    reminder_scheduler.start(bot)  # Also sends reminders saved before a restart
+
+
+@bot.event
+async def on_guild_join(guild):
+    member_index.build(guild)
+    member_snapshot.chunk_in_background(guild, on_chunked=on_guild_chunked)
+
+
+@bot.event
+async def on_member_join(member):
+    member_index.add(member)
+
+
+@bot.event
+async def on_member_update(before, after):
+    if before.display_name != after.display_name or before.name != after.name:
+        member_index.update(after)
+
+
+@bot.event
+async def on_user_update(before, after):
+    # Global name or username changed, re-index the user in every shared guild
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member:
+            member_index.update(member)
+
+
+@bot.event
+async def on_member_remove(member):
+    member_index.remove(member)
+    identity_store.forget_member(member.id)
 
 
 @bot.command(name="opsplan")
-async def opsplan_command(ctx):
+async def opsplan_command(ctx, *args):
     """
     Execute the opsplan functionality.
+
+    Optionally for another shift, e.g. `!opsplan kveld` or `!opsplan i morgen tidlig`.
     """
-    update_ops()
-    deputy_file = "Data/Deputy/Bergen_ops.csv"
-    output_file = "Data/people_on_shift_ops.csv"
-    await prepare_data(ctx, deputy_file, output_file)
+    try:
+        plan_for = shift_to_plan(args)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    people, updated_at = await prepare_data(ctx, "ops", plan_for)
+    if people is None:
+        return
     try:
         #bot_message = await ctx.send("This is your opsplan!")
         #await save_message(ctx, bot_message)
-        await opsplan(ctx)
+        await opsplan(ctx, people, updated_at, plan_for)
     except Exception as e:
         logging.error(f"Error in opsplan command: {e}")
         await ctx.send("An error occurred while processing opsplan. Please try again.")
 
 
 @bot.command(name="mechplan")
-async def mechplan_command(ctx):
+async def mechplan_command(ctx, *args):
     """
-    Execute the mechplan functionality.@
+    Execute the mechplan functionality.
+
+    Optionally for another shift, e.g. `!mechplan kveld` or `!mechplan 24.12 tidlig`.
     """
-    update_mech()
-    deputy_file = "Data/Deputy/Bergen_mech.csv"
-    output_file = "Data/people_on_shift_mech.csv"
-    await prepare_data(ctx, deputy_file, output_file)
+    try:
+        plan_for = shift_to_plan(args)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    people, updated_at = await prepare_data(ctx, "mech", plan_for)
+    if people is None:
+        return
 
     try:
         bot_message = await ctx.send("This is your mechplan!")
         await save_message(ctx, bot_message)
-        await mechplan(ctx)
+        await mechplan(ctx, people, updated_at, plan_for)
     except Exception as e:
         logging.error(f"Error in mechplan command: {e}")
         await ctx.send("An error occurred while processing mechplan. Please try again.")
@@ -91,6 +211,59 @@ async def editplan_command(ctx, *, new_content=None):
     await edit_last_message(ctx, new_content)
 
 
+@bot.command(name="matchreport")
+async def matchreport_command(ctx):
+    """
+    Lists Deputy names that were only fuzzily matched or were ambiguous,
+    so they can be checked and confirmed manually.
+    """
+    report = match_reports.get(ctx.guild.id, {})
+    if not report:
+        await ctx.send("All Deputy names were matched exactly.")
+        return
+
+    lines = []
+    for name, (_, result) in sorted(report.items(), key=lambda item: item[1][1].status):
+        candidates = ", ".join(f"<@{member_id}> ({score:.0%})" for member_id, score in result.candidates[:3])
+        if result.status == "ambiguous":
+            lines.append(f"- **{name}**: ambiguous, could be {candidates}")
+        else:
+            lines.append(f"- **{name}**: matched to <@{result.member_id}> ({result.score:.0%})")
+    await ctx.send(
+        ("**Deputy name matches to check:**\n" + "\n".join(lines)
+         + "\n\nConfirm with `!confirmmatch @member Deputy Name`.")[:2000],  # Discord's message limit
+        allowed_mentions=discord.AllowedMentions.none()
+    )
+
+
+@bot.command(name="confirmmatch")
+@commands.has_permissions(
+    manage_roles=True
+)  # The match decides who gets the on-shift roles from now on
+async def confirmmatch_command(ctx, member: discord.Member, *, deputy_name):
+    """
+    Manually confirms that a Deputy name belongs to a Discord member.
+    The match is saved, so it is used for every later plan.
+    """
+    report = match_reports.get(ctx.guild.id, {})
+    name, employee_id = deputy_name.strip(), None
+    for reported_name, (reported_employee_id, _) in report.items():
+        if normalize_name(reported_name) == normalize_name(name):
+            name, employee_id = reported_name, reported_employee_id
+            break
+
+    if employee_id is not None:
+        identity_store.remember(employee_id, member.id, name, "manual")
+    else:
+        identity_store.remember_name(name, member.id)
+    report.pop(name, None)
+    roster_cache.refresh_in_background(ctx.guild)
+    await ctx.send(
+        f"Saved: **{name}** is {member.mention}.",
+        allowed_mentions=discord.AllowedMentions.none()
+    )
+
+
 @bot.command(name="purge")
 @commands.has_permissions(
     manage_messages=True
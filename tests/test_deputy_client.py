@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import pytest
+
+from Data_extraction.Deputy.deputy_client import DeputyAPIError, iter_json_array
+
+
+class ChunkedStream:
+    """Stands in for an aiohttp stream, returning the body in the given chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = [chunk.encode("utf-8") for chunk in chunks]
+
+    async def read(self, size):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def parse(chunks):
+    async def collect():
+        return [item async for item in iter_json_array(ChunkedStream(chunks))]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("body", [
+    '[1.5, -20, 3e2, 4.25E-1, 0]',
+    '[{"Id": 1, "Name": "Kari Ø"}, {"Id": 2.5}, true, null, "a, ]"]',
+])
+def test_every_chunk_boundary(body):
+    for split in range(1, len(body)):
+        assert parse([body[:split], body[split:]]) == json.loads(body), split
+
+
+def test_number_split_after_decimal_point():
+    assert parse(["[1.", "5]"]) == [1.5]
+
+
+def test_number_split_before_exponent():
+    assert parse(["[12", "e3, 1", "E-2]"]) == [12e3, 1e-2]
+
+
+def test_one_character_chunks():
+    body = '[{"Id": 10, "Modified": "2026-10-18"}, 7.75]'
+    assert parse(list(body)) == json.loads(body)
+
+
+def test_unclosed_array_raises():
+    with pytest.raises(DeputyAPIError):
+        parse(['[1, 2'])
+
+
+def test_trailing_decimal_point_raises():
+    with pytest.raises(DeputyAPIError):
+        parse(['[1.]'])
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from Data_extraction.Deputy.member_index import MATCH_THRESHOLD, MemberIndex, token_score
+
+
+def make_guild(*names):
+    members = [
+        SimpleNamespace(id=index + 1, display_name=name, global_name=None, name=f"user{index + 1}")
+        for index, name in enumerate(names)
+    ]
+    return SimpleNamespace(id=1, name="Test", chunked=True, members=members)
+
+
+def test_single_part_name_scores_below_threshold():
+    assert token_score(["kari", "olsen"], ["kari"]) < MATCH_THRESHOLD
+
+
+def test_single_part_name_is_not_accepted():
+    index = MemberIndex()
+    guild = make_guild("Kari", "Per Hansen")
+    for deputy_name in ("Kari Olsen", "Kari Nordmann"):
+        result = index.match(guild, deputy_name)
+        assert result.status == "ambiguous"
+        assert result.member_id is None
+        assert result.candidates[0][0] == 1
+
+
+def test_two_part_name_is_accepted():
+    index = MemberIndex()
+    guild = make_guild("Christian Modahl", "Per Hansen")
+    result = index.match(guild, "Christian Kyrre Strømme Modahl")
+    assert result.status == "fuzzy"
+    assert result.member_id == 1